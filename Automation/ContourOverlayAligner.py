@@ -1,10 +1,19 @@
 import numpy as np
 import cv2
-from scipy.interpolate import griddata
+from scipy.interpolate import CloughTocher2DInterpolator, RectBivariateSpline
+from scipy.spatial import Delaunay, cKDTree
 import matplotlib.pyplot as plt
 
+from result_memo import ResultMemo
+
 
 class ContourOverlayAlignerCV:
+    GRID_SIZE = 500  # Resolution of the interpolated property map
+    GRID_TOLERANCE = 0.1  # Allowed deviation from a grid line, as a fraction of the grid spacing
+
+    # Delaunay triangulations of irregular indent layouts, shared by every aligner and Z variable
+    triangulations = ResultMemo(max_entries=8)
+
     def __init__(self, screenshot, selected_data, scale_x, scale_y, Z_var='MODULUS'):
         """
         Initialize the ContourOverlayAligner with the screenshot and test data.
@@ -16,25 +25,46 @@ class ContourOverlayAlignerCV:
             scale_y (float): Pixels per micron for the Y-axis.
             Z_var (str): The variable to plot as the Z axis (e.g., 'MODULUS', 'HARDNESS').
         """
-        if Z_var not in selected_data.columns:
-            raise ValueError(f"{Z_var} is not a valid column in the provided data.")
-
         self.screenshot = screenshot
         self.selected_data = selected_data
         self.scale_x = scale_x
         self.scale_y = scale_y
-        self.Z_var = Z_var
 
         # Initialize offsets to center the contour plot
         self.offset_x = screenshot.shape[1] // 2
         self.offset_y = screenshot.shape[0] // 2
         self.bottom_right_pixel = None  # Store the bottom-right pixel of the aligned contour
         self.confirmed = False  # Flag to check if alignment is confirmed
+        self.registration_confidence = None  # Score of the last automatic alignment
+        self.clim = None  # Color limits of the overlay; None scales to the data
+
+        # Rendered contour layer and last blended frame, reused while nothing changes
+        self._layer_key = None
+        self._blended = None
+        self._blended_offsets = None
+
+        self._interpolated = {}  # Z variable -> (xi, yi, zi)
+        self.set_z_var(Z_var)
+
+    def set_z_var(self, Z_var):
+        """
+        Selects the variable shown as the Z axis and interpolates it onto the contour grid.
+        Indents on a (near-)regular X/Y grid are upsampled directly with a bicubic spline;
+        irregular layouts reuse a cached triangulation of their positions, so switching
+        between properties of the same test does not triangulate again.
+
+        Parameters:
+            Z_var (str): The variable to plot as the Z axis (e.g., 'MODULUS', 'HARDNESS').
+        """
+        if Z_var not in self.selected_data.columns:
+            raise ValueError(f"{Z_var} is not a valid column in the provided data.")
+
+        self.Z_var = Z_var
 
         # Extract X, Y, and Z values from the test data
-        self.x_microns = selected_data['X Position'].values
-        self.y_microns = selected_data['Y Position'].values
-        self.z_values = selected_data[Z_var].values
+        self.x_microns = self.selected_data['X Position'].values
+        self.y_microns = self.selected_data['Y Position'].values
+        self.z_values = self.selected_data[Z_var].values
 
         # Handle NaN values in Z
         valid_mask = ~np.isnan(self.z_values)
@@ -43,14 +73,86 @@ class ContourOverlayAlignerCV:
         self.z_values = self.z_values[valid_mask]
 
         # Map microns to pixels
-        self.x_pixels = self.x_microns * scale_x
-        self.y_pixels = self.y_microns * scale_y
+        self.x_pixels = self.x_microns * self.scale_x
+        self.y_pixels = self.y_microns * self.scale_y
 
-        # Create a grid for contour plotting
-        self.xi = np.linspace(self.x_pixels.min(), self.x_pixels.max(), 500)
-        self.yi = np.linspace(self.y_pixels.min(), self.y_pixels.max(), 500)
-        self.xi, self.yi = np.meshgrid(self.xi, self.yi)
-        self.zi = griddata((self.x_pixels, self.y_pixels), self.z_values, (self.xi, self.yi), method='cubic')
+        if Z_var not in self._interpolated:
+            # Create a grid for contour plotting
+            xi = np.linspace(self.x_pixels.min(), self.x_pixels.max(), self.GRID_SIZE)
+            yi = np.linspace(self.y_pixels.min(), self.y_pixels.max(), self.GRID_SIZE)
+            grid = self._regular_grid(self.x_pixels, self.y_pixels, self.z_values)
+            if grid is not None:
+                zi = self._upsample_grid(*grid, xi, yi)
+            else:
+                zi = self._interpolate_scattered(xi, yi)
+            xi, yi = np.meshgrid(xi, yi)
+            self._interpolated[Z_var] = (xi, yi, zi)
+        self.xi, self.yi, self.zi = self._interpolated[Z_var]
+
+    @classmethod
+    def _grid_lines(cls, values):
+        """
+        Clusters coordinates along one axis into grid lines.
+
+        Returns:
+            tuple: (line index of every value, line positions), or None if fewer than two lines.
+        """
+        order = np.argsort(values)
+        gaps = np.diff(values[order])
+        if gaps.size == 0 or gaps.max() <= 0:
+            return None
+        # A new line starts wherever consecutive coordinates jump by more than the tolerance
+        starts = gaps > cls.GRID_TOLERANCE * gaps.max()
+        labels = np.empty(values.size, dtype=np.intp)
+        labels[order] = np.concatenate(([0], np.cumsum(starts)))
+        lines = np.bincount(labels, weights=values) / np.bincount(labels)
+        return labels, lines
+
+    @classmethod
+    def _regular_grid(cls, x, y, z):
+        """
+        Detects indents laid out on a rectilinear grid with one value per grid node.
+
+        Returns:
+            tuple: (column positions, row positions, (rows, columns) Z array), or None if the layout is irregular.
+        """
+        columns, rows = cls._grid_lines(x), cls._grid_lines(y)
+        if columns is None or rows is None:
+            return None
+        (column_of, x_lines), (row_of, y_lines) = columns, rows
+        if x_lines.size * y_lines.size != z.size:
+            return None
+
+        grid = np.full((y_lines.size, x_lines.size), np.nan)
+        grid[row_of, column_of] = z
+        if np.isnan(grid).any():  # Some node is missing or holds two indents
+            return None
+
+        # Every point must lie close to its grid lines
+        x_spacing = np.diff(x_lines).min()
+        y_spacing = np.diff(y_lines).min()
+        if (np.abs(x - x_lines[column_of]).max() > cls.GRID_TOLERANCE * x_spacing or
+                np.abs(y - y_lines[row_of]).max() > cls.GRID_TOLERANCE * y_spacing):
+            return None
+        return x_lines, y_lines, grid
+
+    @staticmethod
+    def _upsample_grid(x_lines, y_lines, grid, xi, yi):
+        # Separable bicubic spline through the grid nodes (lower order for grids with fewer than 4 lines)
+        spline = RectBivariateSpline(y_lines, x_lines, grid, kx=min(3, y_lines.size - 1),
+                                     ky=min(3, x_lines.size - 1), s=0)
+        return spline(yi, xi)
+
+    def _interpolate_scattered(self, xi, yi):
+        # Same Clough-Tocher cubic interpolation as griddata(method='cubic'), on a cached triangulation
+        points = np.column_stack((self.x_pixels, self.y_pixels))
+        key = ResultMemo.digest(points)
+        found, triangulation = self.triangulations.get(key)
+        if not found:
+            triangulation = Delaunay(points)
+            self.triangulations.put(key, triangulation)
+        interpolator = CloughTocher2DInterpolator(triangulation, self.z_values)
+        return interpolator(*np.meshgrid(xi, yi))
 
     def show_contour_plot(self, clim=None):
         """
@@ -59,6 +161,7 @@ class ContourOverlayAlignerCV:
         Parameters:
             clim (tuple, optional): Color limits for the plot as (min, max). If None, use automatic scaling.
         """
+        self.clim = tuple(clim) if clim is not None else None  # The overlay uses the same color limits
         plt.figure(figsize=(8, 6))
         contour = plt.contourf(self.xi, self.yi, self.zi, levels=100, cmap='jet')
         if clim is not None:
@@ -72,31 +175,189 @@ class ContourOverlayAlignerCV:
     def overlay_contour(self):
         """
         Overlay the contour plot on the screenshot using the current offsets.
+        The colored contour layer is rendered once per Z variable and color limits, and the
+        blended frame is only recomputed when the offsets change.
         """
-        # Create a transparent overlay
-        overlay = self.screenshot.copy()
-        contour_img = np.zeros_like(self.screenshot, dtype=np.uint8)
+        layer_key = (self.Z_var, self.clim)
+        if self._layer_key != layer_key:
+            self._render_contour_layer()
+            self._layer_key = layer_key
+            self._blended = None
+
+        offsets = (self.offset_x, self.offset_y)
+        if self._blended is not None and self._blended_offsets == offsets:
+            return self._blended
+
+        # Screen position of the layer's top-left corner (y is flipped for OpenCV's coordinate system)
+        left = int(self.offset_x + self._layer_origin[0])
+        top = int(self.screenshot.shape[0] - self.offset_y - self._layer_origin[1])
+
+        blended = self.screenshot.copy()
+        layer_height, layer_width = self._layer_mask.shape
+        x1, y1 = max(0, left), max(0, top)
+        x2 = min(self.screenshot.shape[1], left + layer_width)
+        y2 = min(self.screenshot.shape[0], top + layer_height)
+        if x1 < x2 and y1 < y2:
+            layer = self._layer[y1 - top:y2 - top, x1 - left:x2 - left]
+            mask = self._layer_mask[y1 - top:y2 - top, x1 - left:x2 - left]
+            region = blended[y1:y2, x1:x2]
+
+            # Blend the overlay and the screenshot for transparency
+            alpha = 0.3  # Adjust transparency (0: fully transparent, 1: fully opaque)
+            mixed = cv2.addWeighted(layer, alpha, region, 1 - alpha, 0)
+            np.copyto(region, mixed, where=mask[:, :, None])
+
+        self._blended = blended
+        self._blended_offsets = offsets
+        return blended
 
+    def _render_contour_layer(self):
+        """
+        Colors the interpolated grid and scatters it once into a layer image with a mask of
+        the pixels it covers, so each frame only needs a single blit at the current offset.
+        """
         # Normalize the Z values for visualization
-        min_z, max_z = np.nanmin(self.zi), np.nanmax(self.zi)
-        normalized_zi = ((self.zi - min_z) / (max_z - min_z) * 255).astype(np.uint8)
+        if self.clim is not None:
+            min_z, max_z = self.clim
+        else:
+            min_z, max_z = np.nanmin(self.zi), np.nanmax(self.zi)
+        clipped_zi = np.nan_to_num(np.clip(self.zi, min_z, max_z), nan=min_z)
+        normalized_zi = ((clipped_zi - min_z) / (max_z - min_z) * 255).astype(np.uint8)
 
         # Apply a colormap to the normalized Z values
         contour_colored = cv2.applyColorMap(normalized_zi, cv2.COLORMAP_JET)
 
-        # Place the contour plot on the overlay at the current offsets
-        for i in range(self.xi.shape[0]):
-            for j in range(self.xi.shape[1]):
-                x = int(self.xi[i, j] + self.offset_x)
-                # Adjust y to flip it vertically for OpenCV's coordinate system
-                y = int(self.screenshot.shape[0] - (self.yi[i, j] + self.offset_y))
-                if 0 <= x < overlay.shape[1] and 0 <= y < overlay.shape[0]:
-                    overlay[y, x] = contour_colored[i, j]
-
-        # Blend the overlay and the screenshot for transparency
-        alpha = 0.3  # Adjust transparency (0: fully transparent, 1: fully opaque)
-        blended = cv2.addWeighted(overlay, alpha, self.screenshot, 1 - alpha, 0)
-        return blended
+        # Grid points in layer pixels: x from the left edge, y flipped from the top edge
+        x_min, y_max = self.xi.min(), self.yi.max()
+        columns = np.floor(self.xi - x_min).astype(np.intp)
+        rows = np.floor(y_max - self.yi).astype(np.intp)
+
+        # Points outside the convex hull of the indents have no value and stay transparent
+        valid = ~np.isnan(self.zi)
+        self._layer = np.zeros((rows.max() + 1, columns.max() + 1, 3), dtype=np.uint8)
+        self._layer_mask = np.zeros(self._layer.shape[:2], dtype=bool)
+        self._layer[rows[valid], columns[valid]] = contour_colored[valid]
+        self._layer_mask[rows[valid], columns[valid]] = True
+        self._layer_origin = (x_min, y_max)
+
+    def auto_align(self, min_confidence=0.5, min_margin=0.3, min_line_evidence=0.5):
+        """
+        Estimates the overlay offsets automatically by correlating the indent pattern of the test
+        data with the indent marks visible in the screenshot (normalized cross-correlation of
+        local-contrast images). The offsets are moved to the best match in any case, so a manual
+        alignment can start from it.
+
+        A regular pattern also correlates well when shifted by whole grid spacings, e.g. when part
+        of it is off-screen and the match slides onto the visible rows. The match is therefore
+        only accepted if the whole pattern lies inside the view with indents under every grid
+        line, and if it beats the matches shifted by one grid spacing along each axis.
+
+        Parameters:
+            min_confidence (float): Minimum correlation score of the best match.
+            min_margin (float): Minimum lead of the best match over the matches shifted by one grid
+                                spacing, as a fraction of the lead expected from one grid line
+                                (confidence / number of grid lines along the axis).
+            min_line_evidence (float): Minimum indent contrast under the weakest grid line of the
+                                       match, relative to the median indent contrast.
+
+        Returns:
+            tuple: (bottom_right_x, bottom_right_y, confidence). The coordinates are the screen pixel
+                   of the bottom-right corner of the contour plot, or None if the match is not confident.
+        """
+        if self.x_pixels.size < 2:
+            print("Automatic alignment needs at least two indents.")
+            self.registration_confidence = 0.0
+            return None, None, 0.0
+
+        # Indent spacing sets the blob size and the search radius around shifted matches
+        distances, _ = cKDTree(np.column_stack((self.x_pixels, self.y_pixels))).query(
+            np.column_stack((self.x_pixels, self.y_pixels)), k=2)
+        spacing = float(np.median(distances[:, 1]))
+        sigma = max(1.0, spacing / 8)
+        pad = int(np.ceil(3 * sigma))
+
+        # Template: a blob at every indent, laid out like the overlay (y flipped)
+        x_min, y_max = self.x_pixels.min(), self.y_pixels.max()
+        columns = np.round(self.x_pixels - x_min).astype(np.intp) + pad
+        rows = np.round(y_max - self.y_pixels).astype(np.intp) + pad
+        template = np.zeros((rows.max() + pad + 1, columns.max() + pad + 1), dtype=np.float32)
+        template[rows, columns] = 1.0
+        template = cv2.GaussianBlur(template, (0, 0), sigma)
+
+        features = self._indent_features(self.screenshot, sigma)
+        if template.shape[0] > features.shape[0] or template.shape[1] > features.shape[1]:
+            print("The indent pattern is larger than the screenshot; automatic alignment is not possible.")
+            self.registration_confidence = 0.0
+            return None, None, 0.0
+
+        # Every tested placement keeps the whole template, and so the whole pattern, inside the view
+        scores = np.nan_to_num(cv2.matchTemplate(features, template, cv2.TM_CCOEFF_NORMED), nan=-1.0)
+        _, confidence, _, (match_x, match_y) = cv2.minMaxLoc(scores)
+
+        # Move the overlay so its indents sit on the matched ones
+        self.offset_x = match_x + pad - x_min
+        self.offset_y = self.screenshot.shape[0] - (match_y + pad) - y_max
+        self.registration_confidence = confidence
+
+        # Indent contrast at the matched indent positions, above the screenshot's background
+        evidence = features[match_y + rows, match_x + columns]
+        background = float(np.median(features))
+        indent_level = float(np.median(evidence)) - background
+        accepted = confidence >= min_confidence and indent_level > 0
+        report = [f"confidence {confidence:.3f}"]
+
+        radius = max(1, int(spacing / 4))
+        for axis, values in (("x", self.x_pixels), ("y", self.y_pixels)):
+            grid_lines = self._grid_lines(values)
+            if grid_lines is None:
+                continue
+            line_of, lines = grid_lines
+            pitch = float(np.median(np.diff(lines)))
+
+            # The matches shifted by one grid spacing either way must be clearly worse
+            shifted = [-1.0]
+            for step in (-pitch, pitch):
+                if axis == "x":
+                    shift_x, shift_y = int(round(match_x + step)), match_y
+                else:
+                    shift_x, shift_y = match_x, int(round(match_y - step))  # Screen y is flipped
+                if 0 <= shift_x < scores.shape[1] and 0 <= shift_y < scores.shape[0]:
+                    shifted.append(float(scores[max(0, shift_y - radius):shift_y + radius + 1,
+                                                max(0, shift_x - radius):shift_x + radius + 1].max()))
+            margin = (confidence - max(shifted)) * lines.size / max(confidence, 1e-6)
+
+            # Every grid line must sit on visible indents; a match that slid onto the visible part
+            # of a partly off-screen pattern leaves its outer line on bare background
+            line_evidence = min(float(evidence[line_of == line].mean()) for line in range(lines.size)) - background
+            line_evidence = line_evidence / indent_level if indent_level > 0 else 0.0
+
+            accepted = accepted and margin >= min_margin and line_evidence >= min_line_evidence
+            report.append(f"{axis} shift margin {margin:.2f}, weakest {axis} line {line_evidence:.2f}")
+        print(f"Automatic alignment: {', '.join(report)}")
+
+        if not accepted:
+            return None, None, confidence
+
+        bottom_right_x = int(round(self.offset_x + self.xi.max()))
+        bottom_right_y = int(round(self.screenshot.shape[0] - self.offset_y - self.yi.min()))
+        return bottom_right_x, bottom_right_y, confidence
+
+    @staticmethod
+    def _indent_features(image, sigma):
+        """
+        Local contrast of the screenshot, blurred to the indent blob size. Colored pixels (the
+        crosshair and other UI markings) are ignored.
+        """
+        if image.ndim == 3:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY).astype(np.float32)
+            saturation = image.max(axis=2).astype(np.int16) - image.min(axis=2)
+            background = cv2.GaussianBlur(gray, (0, 0), 4 * sigma)
+            gray = np.where(saturation < 60, gray, background)
+        else:
+            gray = image.astype(np.float32)
+            background = cv2.GaussianBlur(gray, (0, 0), 4 * sigma)
+        contrast = np.abs(gray - background)
+        return cv2.GaussianBlur(contrast, (0, 0), sigma)
 
     def mouse_callback(self, event, x, y, flags, param):
         """
@@ -118,10 +379,32 @@ class ContourOverlayAlignerCV:
         elif event == cv2.EVENT_LBUTTONUP:
             self.dragging = False
 
-    def start_alignment(self):
+    def start_alignment(self, auto=False, min_confidence=0.5, min_margin=0.3, min_line_evidence=0.5):
         """
         Starts the interactive alignment tool using OpenCV.
+
+        Parameters:
+            auto (bool): Try auto_align first and only open the interactive tool if its match is
+                         not confident; the tool then starts from the automatic estimate.
+            min_confidence (float): Minimum correlation score for an automatic alignment.
+            min_margin (float): Minimum lead of the automatic match over the matches shifted by one grid
+                                spacing, see auto_align.
+            min_line_evidence (float): Minimum indent contrast under every grid line of the automatic match.
+
+        Returns:
+            tuple: (bottom_right_x, bottom_right_y) of the aligned contour plot, or (None, None).
         """
+        if auto:
+            bottom_right_x, bottom_right_y, confidence = self.auto_align(min_confidence, min_margin, min_line_evidence)
+            if bottom_right_x is not None:
+                self.confirmed = True
+                self.bottom_right_pixel = (bottom_right_x, bottom_right_y)
+                print(f"Final bottom-right pixel of the contour plot: {self.bottom_right_pixel}")
+                return bottom_right_x, bottom_right_y
+            print("Automatic alignment is not confident. Falling back to manual alignment.")
+            # The plot was skipped in favour of the automatic alignment, so show it before the manual tool
+            self.show_contour_plot(clim=self.clim)
+
         self.dragging = False
         cv2.namedWindow("Align Contour")
         cv2.setMouseCallback("Align Contour", self.mouse_callback)
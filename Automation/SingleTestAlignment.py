@@ -1,4 +1,3 @@
-import numpy as np
 import pyautogui
 import time
 from automate_alignment import AlignmentAutomation
@@ -8,7 +7,6 @@ from screen_utils import ScreenUtils
 import matplotlib.pyplot as plt
 from image_processing import ImageProcessing
 from ContourOverlayAligner import ContourOverlayAlignerCV
-from scipy.interpolate import griddata
 import random
 import string
 
@@ -47,15 +45,13 @@ class SingleTestAlignment:
 
         # Capture screenshot
         x1, y1, x2, y2 = self.locator.get_bounding_box(image_dir=self.image_directory)
-        screenshot = ScreenUtils.capture_screen_area(x1, y1, x2, y2)
-        plt.imshow(screenshot)
+        # Kept for the later contour alignment, so capture into its own array
+        screenshot_np = ScreenUtils.capture_screen_area_array(x1, y1, x2, y2, pooled=False)
+        plt.imshow(screenshot_np)
         plt.axis('off')
         plt.title("Captured Screenshot")
         plt.show()
 
-        # Convert to numpy array
-        screenshot_np = np.array(screenshot)
-
         # Find the red cross
         crosshair_X, crosshair_Y, red_mask = ImageProcessing.find_red_cross(screenshot_np)
 
@@ -95,22 +91,7 @@ class SingleTestAlignment:
         # Generate a random name
         random_name = self.generate_random_name()
         
-        while True:
-             time.sleep(10)
-             center_coords = self.locator.get_button_coordinates("abort")
-             
-             if not center_coords:
-                   print(f"Image 'abort' not found. Rechecking in 10 seconds...")
-                   time.sleep(10)
-                   center_coords_second_check = self.locator.get_button_coordinates("abort")
-                   if not center_coords_second_check:
-                         print(f"Image 'abort' confirmed as not present. Waiting for 30 more seconds...")
-                         time.sleep(30)
-                         break
-                   else:
-                          print("Second check failed. Restarting wait loop...")
-             else:
-                   print("Image 'abort' found. Still waiting for it to disappear...")
+        self.auto.wait_for_engage()
 
 
         # Click the "start" button
@@ -135,23 +116,13 @@ class SingleTestAlignment:
         pyautogui.hotkey('ctrl', 'a')
         pyautogui.press('backspace')
         time.sleep(2)
-        pyautogui.write(random_name, interval=0.1)
+        self.auto.text_entry.enter(random_name, region=self.auto.text_entry.region_around((click_x, click_y)))
         time.sleep(2)
         
         save_X, save_Y = self.locator.get_button_coordinates("save")
         pyautogui.click(save_X, save_Y)
         # Now the test is started
-        
-        while True:
-            time.sleep(10)
-            center_coords = self.locator.get_button_coordinates('start')
-            if center_coords:
-                print(f"Image start found at {center_coords}. Waiting for 1 more minute...")
-                time.sleep(60)
-                break
-            else:
-                print(f"Image start not found. Still waiting...")
-                time.sleep(60) 
+        self.auto.wait_for_test_completion()
                     	
         # Set extension to 10
         self.auto.set_extension(10, t=2)
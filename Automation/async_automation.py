@@ -0,0 +1,174 @@
+import asyncio
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from automation import Automation
+from image_processing import ImageProcessing
+
+
+class AsyncAutomation:
+    def __init__(self, automation=None, background_workers=2, log_path=None):
+        """
+        Asyncio front end for Automation.
+
+        UI actions (clicks, typing, screen waits, OCR of the instrument window) run one at a
+        time, in submission order, on a single dedicated thread, so they can never interleave.
+        CPU and file work (CSV parsing, result analysis, circle detection, log flushing) runs
+        on a separate thread pool while the instrument is busy.
+
+        Parameters:
+            automation (Automation, optional): Instance to drive. A new one is created if omitted.
+            background_workers (int): Threads available to background tasks.
+            log_path (str, optional): File that log() lines are flushed to.
+        """
+        self.auto = automation or Automation()
+        self.log_path = log_path
+        self._ui_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="automation-ui")
+        self._background_executor = ThreadPoolExecutor(max_workers=background_workers,
+                                                        thread_name_prefix="automation-background")
+        self._background_tasks = set()
+        self._log_lines = []
+
+    async def run_ui(self, func, *args, **kwargs):
+        """
+        Runs a blocking UI action on the UI thread and waits for it.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._ui_executor, functools.partial(func, *args, **kwargs))
+
+    def run_background(self, func, *args, **kwargs):
+        """
+        Schedules blocking non-UI work on the background pool.
+
+        Returns:
+            asyncio.Task: Task resolving to the function's result.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._background_executor, functools.partial(func, *args, **kwargs))
+        task = asyncio.ensure_future(future)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+
+    async def drain(self):
+        """
+        Waits for every background task scheduled so far.
+
+        Returns:
+            list: Results (or exceptions) of the tasks.
+        """
+        return await asyncio.gather(*list(self._background_tasks), return_exceptions=True)
+
+    # UI actions
+
+    async def move(self, amount, direction, **kwargs):
+        return await self.run_ui(self.auto.move, amount, direction, **kwargs)
+
+    async def engage(self):
+        return await self.run_ui(self.auto.engage)
+
+    async def set_extension(self, number, **kwargs):
+        return await self.run_ui(self.auto.set_extension, number, **kwargs)
+
+    async def get_xyz_positions(self):
+        return await self.run_ui(self.auto.get_xyz_positions)
+
+    async def current_position(self):
+        return await self.run_ui(self.auto.current_position)
+
+    async def save_and_export_results(self, file_path_imicro, random_name):
+        return await self.run_ui(self.auto.save_and_export_results, file_path_imicro, random_name)
+
+    async def wait_for_engage(self, **kwargs):
+        return await self.run_ui(self.auto.wait_for_engage, **kwargs)
+
+    async def wait_for_test_completion(self, **kwargs):
+        return await self.run_ui(self.auto.wait_for_test_completion, **kwargs)
+
+    async def wait_and_read_file(self, image_path, file_path=None, blitz=False, settle=5, file_timeout=None,
+                                 since=None):
+        """
+        Awaitable version of wait_and_read_file / wait_and_read_file_blitz. Only the screen wait
+        occupies the UI thread; waiting for the CSV and parsing it run in the background.
+        """
+        file_path = file_path or self.auto.default_file_path
+        since = self.auto.results_since(since)
+        if file_timeout is None:
+            file_timeout = 120 if blitz else 60
+        columns = Automation.BLITZ_RESULT_COLUMNS if blitz else Automation.NORMAL_RESULT_COLUMNS
+
+        await self.run_ui(self.auto.locator.wait_for_button, image_path, appears=True, settle=settle)
+        if not await self.run_background(Automation.wait_for_file, file_path, timeout=file_timeout, newer_than=since):
+            return None, None
+        return await self.run_background(Automation.read_results_file, file_path, columns)
+
+    # Background work
+
+    def read_results_in_background(self, file_path, blitz=False):
+        """
+        Parses an exported results CSV in the background.
+
+        Returns:
+            asyncio.Task: Task resolving to (data, selected_data).
+        """
+        columns = Automation.BLITZ_RESULT_COLUMNS if blitz else Automation.NORMAL_RESULT_COLUMNS
+        return self.run_background(Automation.read_results_file, file_path, columns)
+
+    def detect_circles_in_background(self, image, radius_range, X_scale, Y_scale):
+        """
+        Runs circle detection for the next sample in the background. Images that are not arrays
+        (e.g. a TiledImage macro image) are read block by block.
+
+        Returns:
+            asyncio.Task: Task resolving to (detected_circles, detected_circles_with_radius).
+        """
+        if not isinstance(image, np.ndarray):
+            return self.run_background(ImageProcessing.detect_circles_in_blocks, image, radius_range, X_scale, Y_scale)
+        return self.run_background(ImageProcessing.detect_circles_with_contours, image, radius_range, X_scale, Y_scale)
+
+    def log(self, message):
+        """
+        Buffers a timestamped log line; it is written by the next flush_log().
+        """
+        self._log_lines.append(f"{time.strftime('%Y-%m-%d %H:%M:%S')} {message}\n")
+
+    def flush_log(self):
+        """
+        Writes buffered log lines to log_path in the background.
+
+        Returns:
+            asyncio.Task or None: The flush task, or None if there is nothing to write.
+        """
+        if not self.log_path or not self._log_lines:
+            return None
+        lines, self._log_lines = self._log_lines, []
+        return self.run_background(self._append_lines, self.log_path, lines)
+
+    @staticmethod
+    def _append_lines(path, lines):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "a") as file:
+            file.writelines(lines)
+
+    # Lifecycle
+
+    async def close(self):
+        """
+        Flushes the log, waits for background work and shuts both thread pools down.
+        """
+        self.flush_log()
+        await self.drain()
+        self._ui_executor.shutdown(wait=True)
+        self._background_executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
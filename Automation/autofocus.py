@@ -0,0 +1,124 @@
+import math
+import time
+
+from image_processing import ImageProcessing
+from screen_utils import ScreenUtils
+
+
+class Autofocus:
+    GOLDEN_RATIO = (math.sqrt(5) - 1) / 2
+
+    def __init__(self, automation, max_size=256, settle=0.5, coarse_steps=4, tolerance=0.25, noise=0.02):
+        """
+        Image-based autofocus for Automation: steps the extension with set_extension and scores
+        the sharpness of the micro camera view (the XY1/XY2 bounding box) after every step.
+
+        The search samples a coarse grid of extensions, then narrows the bracket around the
+        sharpest one by golden-section search until it is narrower than tolerance. When the two
+        inner points score within noise of each other, a capture halfway between them tells
+        whether the peak lies between them or on the side of the sharper one, and the bracket
+        shrinks accordingly. With the defaults it needs about 13 captures (at most 15), each a
+        full set_extension sequence. Scoring works on a downsampled view, so the stage, not the
+        CPU, sets the pace.
+
+        Parameters:
+            automation (Automation): Drives the extension and locates the micro view.
+            max_size (int): Larger side in pixels the view is downsampled to before scoring.
+            settle (float): Seconds waited after setting the extension before capturing.
+            coarse_steps (int): Number of extensions sampled over the whole search range.
+            tolerance (float): Width of the final bracket in extension units; the result is within
+                               tolerance of the sharpest extension.
+            noise (float): Relative sharpness difference below which two extensions count as equally sharp.
+        """
+        if coarse_steps < 3:
+            raise ValueError("coarse_steps must be at least 3.")
+        self.auto = automation
+        self.max_size = max_size
+        self.settle = settle
+        self.coarse_steps = coarse_steps
+        self.tolerance = tolerance
+        self.noise = noise
+        self.view_box = None
+        self.scores = {}  # Extension -> sharpness of the current run
+
+    def locate_view(self):
+        """
+        Locates the micro camera view once; later captures reuse its bounding box.
+        """
+        if self.view_box is None:
+            self.view_box = self.auto.locator.get_bounding_box(image_dir=self.auto.image_directory)
+        return self.view_box
+
+    def score_view(self):
+        """
+        Captures the micro camera view and returns its sharpness.
+        """
+        x1, y1, x2, y2 = self.locate_view()
+        view = ScreenUtils.capture_screen_area_array(x1, y1, x2, y2, mode="gray")
+        return ImageProcessing.sharpness(view, max_size=self.max_size)
+
+    def measure(self, extension):
+        """
+        Sets the extension, waits for the view to settle and scores it. Extensions already
+        measured in this run are not visited again.
+        """
+        extension = round(extension, 3)
+        if extension not in self.scores:
+            self.auto.set_extension(extension)
+            time.sleep(self.settle)
+            self.scores[extension] = self.score_view()
+        return self.scores[extension]
+
+    def run(self, low=0.0, high=11.0):
+        """
+        Searches the extension of the sharpest view in [low, high] and leaves the stage there.
+
+        Parameters:
+            low (float): Lowest extension searched.
+            high (float): Highest extension searched (at most 11).
+
+        Returns:
+            tuple: (best extension, its sharpness, number of captures).
+        """
+        if not low < high:
+            raise ValueError(f"Invalid autofocus range: [{low}, {high}]")
+        self.scores = {}
+
+        # Coarse pass: bracket the sharpest extension between its grid neighbours
+        step = (high - low) / (self.coarse_steps - 1)
+        grid = [low + index * step for index in range(self.coarse_steps)]
+        best = max(range(len(grid)), key=lambda index: self.measure(grid[index]))
+        a, b = grid[max(best - 1, 0)], grid[min(best + 1, len(grid) - 1)]
+
+        # Fine pass: golden-section search, one capture per step
+        c = b - self.GOLDEN_RATIO * (b - a)
+        d = a + self.GOLDEN_RATIO * (b - a)
+        while b - a > self.tolerance:
+            score_c, score_d = self.measure(c), self.measure(d)
+            if abs(score_c - score_d) <= self.noise * max(abs(score_c), abs(score_d)):
+                # Equally sharp within the noise: a capture halfway between them tells whether the
+                # peak lies between them, or on the side of the sharper one
+                middle = (c + d) / 2
+                score_middle = self.measure(middle)
+                if score_middle >= max(score_c, score_d):
+                    a, b = c, d
+                    c, d = b - self.GOLDEN_RATIO * (b - a), middle
+                elif score_c >= score_d:
+                    b, d = middle, c
+                    c = b - self.GOLDEN_RATIO * (b - a)
+                else:
+                    a, c = middle, d
+                    d = a + self.GOLDEN_RATIO * (b - a)
+            elif score_c >= score_d:
+                b, d = d, c
+                c = b - self.GOLDEN_RATIO * (b - a)
+            else:
+                a, c = c, d
+                d = a + self.GOLDEN_RATIO * (b - a)
+
+        # Sharpest capture inside the final bracket (its ends are always captured)
+        inside = [item for item in self.scores.items() if a - 0.001 <= item[0] <= b + 0.001]
+        extension, score = max(inside, key=lambda item: item[1])
+        self.auto.focus_to(extension, tolerance=0.0)
+        print(f"Autofocus: extension {extension} (sharpness {score:.1f}) after {len(self.scores)} captures")
+        return extension, score, len(self.scores)
@@ -1,9 +1,14 @@
 import cv2
 import math
+import numpy as np
 import matplotlib.pyplot as plt
 from automation import Automation
 from micro_macro_alignment import MicroMacroAlignment
 from image_processing import ImageProcessing
+from pyramid_viewer import PyramidViewer
+from route_planner import RoutePlanner
+from stage_transform import StageTransform
+from focus_surface import FocusSurface
 
 class AlignmentAutomation:
     def __init__(self, macro_image_path=None, macro_scale_x=None, macro_scale_y=None):
@@ -12,11 +17,13 @@ class AlignmentAutomation:
         If macro image parameters are not provided, only micro alignment functionality will be available.
         """
         self.auto = Automation()
-        self.rotated_macro_image = None  # To store the rotated macro image
+        self.macro_rotation = None  # 2x3 affine from macro image pixels to rotated macro pixels
+        self.rotated_macro_size = None  # (width, height) of the rotated macro image
         self.new_origin_macro = None  # To store the new origin of the macro image
         self.new_origin_micro = None  # To store the new origin in the micro image
         self.new_origin_micro_single_test = None  # To store the single-test origin in the micro image
         self.where_we_are_micro = None  # To store the current location in pixels during single-test mode
+        self.route_planner = RoutePlanner()  # Orders the targets of move_to_points
 
         # Macro image setup is optional
         if macro_image_path and macro_scale_x and macro_scale_y:
@@ -39,6 +46,48 @@ class AlignmentAutomation:
         rotated = cv2.warpAffine(image, matrix, (w, h))
         return rotated
 
+    @staticmethod
+    def rotation_transform(size, angle):
+        """
+        Computes the rotation of an image about its center as an affine transform, with the
+        output enlarged so that no corner is clipped.
+
+        Parameters:
+            size (tuple): (width, height) of the image.
+            angle (float): Rotation angle in degrees (counter-clockwise).
+
+        Returns:
+            tuple: (2x3 affine matrix from image pixels to rotated pixels, (width, height) of the rotated image).
+        """
+        w, h = size
+        matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+        cos, sin = abs(matrix[0, 0]), abs(matrix[0, 1])
+        rotated_w = int(np.ceil(w * cos + h * sin))
+        rotated_h = int(np.ceil(w * sin + h * cos))
+        matrix[0, 2] += rotated_w / 2 - w / 2
+        matrix[1, 2] += rotated_h / 2 - h / 2
+        return matrix, (rotated_w, rotated_h)
+
+    def rotated_to_macro(self, points):
+        """
+        Maps points of the rotated macro image back to the original macro image.
+
+        Parameters:
+            points (list of tuple): Points (x, y) in rotated macro pixels.
+
+        Returns:
+            list of tuple: Points (x, y) in original macro pixels.
+        """
+        if self.macro_rotation is None:
+            raise ValueError("Macro rotation not available. Call 'automate_alignment' first.")
+        inverse = cv2.invertAffineTransform(self.macro_rotation)
+        mapped = np.column_stack((np.asarray(points, dtype=float).reshape(-1, 2), np.ones(len(points)))) @ inverse.T
+        return [(float(x), float(y)) for x, y in mapped]
+
+    def _macro_viewer(self, window_name, pan_event):
+        return PyramidViewer(self.alignment.macro_image, window_name, pan_event=pan_event,
+                             transform=self.macro_rotation, image_size=self.rotated_macro_size)
+
     def automate_alignment(self):
         """
         Automates the alignment process between the micro and macro images.
@@ -85,8 +134,9 @@ class AlignmentAutomation:
         print(f"Big Image Angle: {degrees_big}°")
         print(f"Rotation Angle: {rotation_angle}°")
 
-        # Step 7: Rotate the macro image
-        self.rotated_macro_image = self.rotate_image_opencv(self.alignment.macro_image, rotation_angle)
+        # Step 7: Rotate the macro image (only the displayed region is ever warped)
+        height, width = self.alignment.macro_image.shape[:2]
+        self.macro_rotation, self.rotated_macro_size = self.rotation_transform((width, height), rotation_angle)
 
         # Step 8: Redefine the origin on the rotated macro image
         print("Please select the new origin on the rotated macro image.")
@@ -95,90 +145,56 @@ class AlignmentAutomation:
 
         print(f"New origin selected at: {self.new_origin_macro}")
 
-        # Step 9: Display the rotated image
-        plt.imshow(cv2.cvtColor(self.rotated_macro_image, cv2.COLOR_BGR2RGB))
+        # Step 9: Display an overview of the rotated image
+        preview = self._macro_viewer("Rotated Macro Image", cv2.EVENT_RBUTTONDOWN)
+        preview_scale = preview.zoom_scale
+        plt.imshow(cv2.cvtColor(preview.render(), cv2.COLOR_BGR2RGB),
+                   extent=(0, preview.view_size[0] / preview_scale, preview.view_size[1] / preview_scale, 0))
         plt.title(f"Rotated Image by {rotation_angle}°")
         plt.axis("on")
         plt.show()
 
-        # Return the rotated image
-        return self.rotated_macro_image
+        # Return the rotation of the macro image
+        return self.macro_rotation
     
     def select_new_origin(self):
         """
         Allows the user to select the new origin on the rotated macro image.
         Opens the rotated macro image in a zoomable and pannable window for origin selection.
 
+        Controls:
+            - Left Click: Select the origin.
+            - Scroll Wheel: Zoom in/out.
+            - Right Click + Drag: Pan the image.
+            - ESC: Exit without selecting.
+
         Returns:
             tuple: New origin coordinates (x, y) in the rotated macro image.
         """
-        if self.rotated_macro_image is None:
+        if self.macro_rotation is None:
             raise ValueError("Rotated macro image not available. Call 'automate_alignment' first.")
 
-        # Convert variables to instance variables to avoid local binding issues
-        self.zoom_scale = 1.0  # Initial zoom level
-        self.pan_x, self.pan_y = 0, 0  # Initial pan offset
-        self.dragging = False  # Dragging state
-        self.drag_start_x, self.drag_start_y = 0, 0  # Drag starting coordinates
+        viewer = self._macro_viewer("Select New Origin", cv2.EVENT_RBUTTONDOWN)
         points = []  # Store the selected point
 
-        def update_display():
-            """ Update the displayed image based on current zoom and pan settings. """
-            height, width = self.rotated_macro_image.shape[:2]
-            resized = cv2.resize(
-                self.rotated_macro_image, (int(width * self.zoom_scale), int(height * self.zoom_scale))
-            )
-            view_x, view_y = max(0, -self.pan_x), max(0, -self.pan_y)
-            end_x = min(resized.shape[1], view_x + width)
-            end_y = min(resized.shape[0], view_y + height)
-            visible_image = resized[view_y:end_y, view_x:end_x]
-            cv2.imshow("Select New Origin", visible_image)
-
-        def click_event(event, x, y, flags, param):
-            """ Handles mouse events for selecting, panning, and zooming. """
+        def click_event(event, x, y, flags):
+            """ Handles clicks that are not used for panning or zooming. """
             if event == cv2.EVENT_LBUTTONDOWN:
-                points.append((int((x + self.pan_x) / self.zoom_scale), int((y + self.pan_y) / self.zoom_scale)))
+                points.append(viewer.to_image(x, y))
                 print(f"New Origin Selected: {points[-1]}")
-                cv2.destroyWindow("Select New Origin")  # Close the window after selection
 
-            elif event == cv2.EVENT_RBUTTONDOWN:
-                self.dragging = True
-                self.drag_start_x, self.drag_start_y = x, y
-
-            elif event == cv2.EVENT_MOUSEMOVE and self.dragging:
-                dx = x - self.drag_start_x
-                dy = y - self.drag_start_y
-                self.pan_x -= dx
-                self.pan_y -= dy
-                self.drag_start_x, self.drag_start_y = x, y
-                update_display()
-
-            elif event == cv2.EVENT_RBUTTONUP:
-                self.dragging = False
-
-            elif event == cv2.EVENT_MOUSEWHEEL:
-                if flags > 0:
-                    self.zoom_scale *= 1.1
-                else:
-                    self.zoom_scale /= 1.1
-                self.zoom_scale = max(0.1, min(self.zoom_scale, 10))
-                update_display()
-
-        cv2.namedWindow("Select New Origin", cv2.WINDOW_NORMAL)
-        cv2.setMouseCallback("Select New Origin", click_event)
-
-        while True:
-            update_display()
+        viewer.open(click_event)
+
+        while not points:
+            viewer.show()
             key = cv2.waitKey(1)
 
             if key == 27:  # ESC key to exit without selecting
                 print("No origin selected. Window closed.")
-                cv2.destroyWindow("Select New Origin")
+                viewer.close()
                 return None
 
-            if len(points) > 0:
-                break
-
+        viewer.close()  # Close the window after selection
         return points[0]
     
     def select_points_macro(self):
@@ -190,145 +206,138 @@ class AlignmentAutomation:
             - Left Click: Select a point (can select multiple).
             - Right Click: Finish selection and close the window.
             - Scroll Wheel: Zoom in/out.
-            - Right Click + Drag: Pan the image.
+            - Middle Click + Drag: Pan the image.
             - ESC: Exit without saving points.
 
         Returns:
-            list of tuples: List of selected points (x, y) in the macro image.
+            list of tuples: List of selected points (x, y) in the rotated macro image
+                            (rotated_to_macro maps them to the original image).
         """
-        if self.rotated_macro_image is None:
+        if self.macro_rotation is None:
             raise ValueError("Rotated macro image not available. Call 'automate_alignment' first.")
 
-        self.zoom_scale = 1.0  # Initial zoom level
-        self.pan_x, self.pan_y = 0, 0  # Initial pan offsets
-        self.dragging = False  # Drag state for panning
-        self.drag_start_x, self.drag_start_y = 0, 0  # Drag starting coordinates
-        points = []  # Store selected points
-
-        def update_display():
-            """ Update the displayed image based on the current zoom and pan settings. """
-            height, width = self.rotated_macro_image.shape[:2]
-            resized = cv2.resize(
-                self.rotated_macro_image, (int(width * self.zoom_scale), int(height * self.zoom_scale))
-            )
-            view_x, view_y = max(0, -self.pan_x), max(0, -self.pan_y)
-            end_x = min(resized.shape[1], view_x + width)
-            end_y = min(resized.shape[0], view_y + height)
-            visible_image = resized[view_y:end_y, view_x:end_x].copy()
+        viewer = self._macro_viewer("Select Points in Macro Image", cv2.EVENT_MBUTTONDOWN)
+        points = viewer.marks  # Selected points are drawn on the view
+        finished = []
 
-            # Draw all selected points on the displayed image
-            for point in points:
-                scaled_point = (int(point[0] * self.zoom_scale - self.pan_x), int(point[1] * self.zoom_scale - self.pan_y))
-                cv2.circle(visible_image, scaled_point, 5, (255, 0, 0), -1)
-
-            cv2.imshow("Select Points in Macro Image", visible_image)
-
-        def click_event(event, x, y, flags, param):
-            """ Handles mouse events for selecting, panning, and zooming. """
+        def click_event(event, x, y, flags):
+            """ Handles clicks that are not used for panning or zooming. """
             if event == cv2.EVENT_LBUTTONDOWN:
                 # Left-click to select a point
-                point = (int((x + self.pan_x) / self.zoom_scale), int((y + self.pan_y) / self.zoom_scale))
+                point = viewer.to_image(x, y)
                 points.append(point)
                 print(f"Point {len(points)}: {point}")
-                update_display()
+                viewer.dirty = True
 
             elif event == cv2.EVENT_RBUTTONDOWN:
                 # Stop selection with right-click
                 print("Point selection finished.")
-                cv2.destroyWindow("Select Points in Macro Image")
-
-            elif event == cv2.EVENT_MOUSEMOVE and self.dragging:
-                # Pan the image by dragging
-                dx = x - self.drag_start_x
-                dy = y - self.drag_start_y
-                self.pan_x -= dx
-                self.pan_y -= dy
-                self.drag_start_x, self.drag_start_y = x, y
-                update_display()
-
-            elif event == cv2.EVENT_RBUTTONUP:
-                self.dragging = False
-
-            elif event == cv2.EVENT_MBUTTONDOWN:
-                # Start dragging when middle button is pressed
-                self.dragging = True
-                self.drag_start_x, self.drag_start_y = x, y
-
-            elif event == cv2.EVENT_MOUSEWHEEL:
-                # Zoom in/out with scroll wheel
-                if flags > 0:
-                    self.zoom_scale *= 1.1
-                else:
-                    self.zoom_scale /= 1.1
-                self.zoom_scale = max(0.1, min(self.zoom_scale, 10))
-                update_display()
+                finished.append(True)
 
         # Create the OpenCV window and set the mouse callback
-        cv2.namedWindow("Select Points in Macro Image", cv2.WINDOW_NORMAL)
-        cv2.setMouseCallback("Select Points in Macro Image", click_event)
+        viewer.open(click_event)
 
         print("Left-click to select points. Right-click to finish. ESC to exit without saving.")
-        while True:
-            update_display()
+        while not finished:
+            viewer.show()
             key = cv2.waitKey(1)
 
             if key == 27:  # ESC key to exit without saving
                 print("Selection cancelled. No points saved.")
-                cv2.destroyWindow("Select Points in Macro Image")
+                viewer.close()
                 return []
 
-        return points
+        viewer.close()
+        return list(points)
+
 
+    def macro_stage_transform(self, stage_origin):
+        """
+        Transform from rotated macro pixels to stage microns, with the selected macro origin at
+        stage_origin. The stage axes point against the macro image axes.
+
+        Parameters:
+            stage_origin (tuple): Stage position (X, Y) of the macro origin in microns.
 
-    def move_to_points(self, selected_points, params=None):
+        Returns:
+            StageTransform: The transform.
+        """
+        return StageTransform(self.new_origin_macro, (self.alignment.macro_scale_x, self.alignment.macro_scale_y),
+                              stage_origin=stage_origin, invert=(True, True))
+
+    def _move_towards(self, current_x, current_y, target_x, target_y):
+        """
+        Issues the relative X and Y moves from the current stage position to a target position.
+
+        Returns:
+            tuple: (relative_dx, relative_dy) in microns, as passed to the moves.
+        """
+        relative_dx = round(current_x - target_x, 2)
+        relative_dy = round(current_y - target_y, 2)
+
+        # Correct movement directions (macro vs micro inversion)
+        move_x = "left" if relative_dx < 0 else "right"
+        move_y = "down" if relative_dy > 0 else "up"
+
+        # Move in X direction
+        if relative_dx != 0:
+            print(f"Moving {abs(relative_dx)} microns in X ({move_x})")
+            self.auto.move(abs(relative_dx), move_x)
+
+        # Move in Y direction
+        if relative_dy != 0:
+            print(f"Moving {abs(relative_dy)} microns in Y ({move_y})")
+            self.auto.move(abs(relative_dy), move_y)
+        return relative_dx, relative_dy
+
+    def move_to_points(self, selected_points, params=None, plan_route=True):
         """
         Moves to the selected points in the micro image based on the macro image coordinates.
 
         Parameters:
             selected_points (list of tuple): List of points in the macro image coordinates.
-            params (list): Focus plane parameters [a, b, c] for focus adjustment, if any.
+            params (FocusSurface or list): Focus surface (or plane parameters [a, b, c]) for focus adjustment, if any.
+            plan_route (bool): Visit the points in the order planned by route_planner (shortest
+                               travel with few axis reversals) instead of the selection order.
+
+        Returns:
+            numpy.ndarray: Indices of selected_points in the order they were visited.
         """
         if not selected_points:
             raise ValueError("No points selected.")
         if self.new_origin_macro is None or self.new_origin_micro is None:
             raise ValueError("New origins not set. Please ensure 'automate_alignment' was completed.")
 
-        # Adjust points relative to the new origin in the macro image
-        adjusted_points = [(x - self.new_origin_macro[0], y - self.new_origin_macro[1]) for x, y in selected_points]
+        # Stage positions of all points at once
+        targets = self.macro_stage_transform(self.new_origin_micro).to_stage(selected_points)
 
         # Get the current position in the micro image
         current_x, current_y, _ = self.auto.get_xyz_positions()
 
-        # Move to each adjusted point
-        for idx, (macro_dx, macro_dy) in enumerate(adjusted_points):
-            # Convert macro deltas to micro deltas
-            micro_dx = round(macro_dx / self.alignment.macro_scale_x, 2)
-            micro_dy = round(macro_dy / self.alignment.macro_scale_y, 2)
-
-            # Calculate relative move in micro coordinates
-            relative_dx = round(micro_dx + (current_x - self.new_origin_micro[0]), 2)
-            relative_dy = round(micro_dy + (current_y - self.new_origin_micro[1]), 2)
+        order = np.arange(len(targets))
+        if plan_route:
+            order, summary = self.route_planner.plan(targets, start=(current_x, current_y))
+            print(f"Planned route: {summary['planned_length']:.1f} microns, {summary['planned_reversals']} reversals "
+                  f"(selection order: {summary['naive_length']:.1f} microns, {summary['naive_reversals']} reversals)")
 
-            # Correct movement directions (macro vs micro inversion)
-            move_x = "left" if relative_dx < 0 else "right"
-            move_y = "down" if relative_dy > 0 else "up"
+        # Focus heights of the whole route at once, if a focus surface is provided
+        heights = None if params is None else FocusSurface.as_surface(params).predict(targets[order])
+        focus_changes = 0
 
-            # Move in X direction
-            if relative_dx != 0:
-                print(f"Moving {abs(relative_dx)} microns in X ({move_x})")
-                self.auto.move(abs(relative_dx), move_x)
+        # Move to each point
+        for index, (target_x, target_y) in enumerate(targets[order]):
+            self._move_towards(current_x, current_y, target_x, target_y)
 
-            # Move in Y direction
-            if relative_dy != 0:
-                print(f"Moving {abs(relative_dy)} microns in Y ({move_y})")
-                self.auto.move(abs(relative_dy), move_y)
+            # Focus, skipping changes within the focus tolerance
+            if heights is not None:
+                focus_changes += self.auto.focus_to(round(float(heights[index]), 3))
 
-            # Focus if parameters are provided
-            if params is not None:
-                self.auto.focus(params)
+            # Update the current position (predicted from the moves, read back only when a check is due)
+            current_x, current_y, _ = self.auto.current_position()
 
-            # Update the current position
-            current_x, current_y, _ = self.auto.get_xyz_positions()
+        if heights is not None:
+            print(f"Focus changed at {focus_changes} of {len(order)} points.")
+        return order
             
     def define_small_origin(self, origin=None):
         """
@@ -490,38 +499,18 @@ class AlignmentAutomation:
         if self.new_origin_macro is None or self.new_origin_micro_single_test is None:
             raise ValueError("New origins not set. Please ensure 'automate_alignment' was completed.")
 
-        # Adjust points relative to the new origin in the macro image
-        adjusted_points = [(x - self.new_origin_macro[0], y - self.new_origin_macro[1]) for x, y in selected_points]
+        # Stage positions of all points at once
+        targets = self.macro_stage_transform(self.new_origin_micro_single_test).to_stage(selected_points)
 
         # Get the current position in the micro image
         current_x, current_y, _ = self.auto.get_xyz_positions()
 
-        # Move to each adjusted point
-        for idx, (macro_dx, macro_dy) in enumerate(adjusted_points):
-            # Convert macro deltas to micro deltas
-            micro_dx = round(macro_dx / self.alignment.macro_scale_x, 2)
-            micro_dy = round(macro_dy / self.alignment.macro_scale_y, 2)
-
-            # Calculate relative move in micro coordinates
-            relative_dx = round(micro_dx + (current_x - self.new_origin_micro_single_test[0]), 2)
-            relative_dy = round(micro_dy + (current_y - self.new_origin_micro_single_test[1]), 2)
-
-            # Correct movement directions (macro vs micro inversion)
-            move_x = "left" if relative_dx < 0 else "right"
-            move_y = "down" if relative_dy > 0 else "up"
-
-            # Move in X direction
-            if relative_dx != 0:
-                print(f"Moving {abs(relative_dx)} microns in X ({move_x})")
-                self.auto.move(abs(relative_dx), move_x)
-
-            # Move in Y direction
-            if relative_dy != 0:
-                print(f"Moving {abs(relative_dy)} microns in Y ({move_y})")
-                self.auto.move(abs(relative_dy), move_y)
+        # Move to each point
+        for target_x, target_y in targets:
+            self._move_towards(current_x, current_y, target_x, target_y)
             
-            # Update the current position
-            current_x, current_y, _ = self.auto.get_xyz_positions()
+            # Update the current position (predicted from the moves, read back only when a check is due)
+            current_x, current_y, _ = self.auto.current_position()
     
     def single_test_origins(self,new_origin_micro_single_test,where_we_are_micro):
         '''defines the single test origins after alignment'''
@@ -530,7 +519,8 @@ class AlignmentAutomation:
         self.where_we_are_micro=where_we_are_micro
         
         
-    def single_test_origin_alignment_based(self, micro_image, aligner, scale_x, scale_y, initial_xyz, Z_var='MODULUS', clim=None):
+    def single_test_origin_alignment_based(self, micro_image, aligner, scale_x, scale_y, initial_xyz, Z_var='MODULUS', clim=None,
+                                           auto_register=True, min_confidence=0.5):
         """
         Updates the X and Y origin of the micro system for single test alignment based on the crosshair 
         and user-aligned contour plot.
@@ -543,6 +533,9 @@ class AlignmentAutomation:
             initial_xyz (tuple): Initial XYZ position under the optical lens (X, Y, Z).
             Z_var (str): Variable for the Z axis in the contour plot.
             clim (tuple, optional): Color limits for the contour plot. Defaults to None.
+            auto_register (bool): Align the contour plot automatically and only ask the user when
+                                  the match is not confident.
+            min_confidence (float): Minimum correlation score for an automatic alignment.
 
         Returns:
             tuple: Updated origin for the micro system in single-test mode (X, Y) and current location (bottom-right).
@@ -558,8 +551,13 @@ class AlignmentAutomation:
         print(f"Point we thought we were: {point_thought}")
         
         # Configure and align the contour plot
-        aligner.show_contour_plot(clim=clim)  # Show contour plot for user confirmation
-        contour_bottom_right_x, contour_bottom_right_y = aligner.start_alignment()  # Start alignment for user to adjust the contour
+        if auto_register:
+            aligner.clim = tuple(clim) if clim is not None else None
+        else:
+            aligner.show_contour_plot(clim=clim)  # Show contour plot for user confirmation
+        # Start alignment (automatic first if requested) for user to adjust the contour
+        contour_bottom_right_x, contour_bottom_right_y = aligner.start_alignment(auto=auto_register,
+                                                                                 min_confidence=min_confidence)
         
         point_actual = (contour_bottom_right_x, contour_bottom_right_y)
         if point_actual is None:
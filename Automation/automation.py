@@ -2,30 +2,67 @@ import os
 import pyautogui
 import time
 import pandas as pd
-import pytesseract
-import numpy as np
 from button_locator import ButtonLocator
 from screen_utils import ScreenUtils
 import random
 import string
-import cv2
 import re
-from image_processing import ImageProcessing
+from numeric_readout import NumericReadout
+from result_memo import ResultMemo
+from stage_transform import StageTransform
+from motion_planner import MotionPlanner
+from stage_state import StageState
+from focus_surface import FocusSurface
+from autofocus import Autofocus
+from text_entry import TextEntry
+from timing_profile import TimingProfile
 
 
 class Automation:
-    def __init__(self, image_directory="assets"):
+    # Columns selected from the exported results of each method
+    NORMAL_RESULT_COLUMNS = ['Hardness', 'Modulus', 'X', 'Y']
+    BLITZ_RESULT_COLUMNS = ['X Position', 'Y Position', 'Z Position', 'MODULUS', 'HARDNESS']
+    # Displacement applied before raising the extension
+    RAISE_DISPLACEMENT = 12.5
+
+    def __init__(self, image_directory="assets", state_directory=None):
         self.locator = ButtonLocator(image_directory)
+        self.readout = NumericReadout()
+        self.ocr_memo = ResultMemo(max_entries=64)
+        self.motion_planner = MotionPlanner()
+        self.stage = StageState()  # Predicted stage position between OCR readouts
+        self.focus_tolerance = 0.01  # Extension changes up to this size are not sent to the instrument
+        self.autofocuser = Autofocus(self)
+        self.text_entry = TextEntry()  # Switch with set_text_entry_mode
+        # Learned UI delays; see TimingProfile for learning them and switching profiles. Runtime
+        # state is kept out of the template directory, in the user's home unless given
+        self.state_directory = state_directory or os.path.join(os.path.expanduser("~"), ".imicro_automation")
+        self.timing = TimingProfile(os.path.join(self.state_directory, "timing_profile.json"))
+        # Last confirmed extension and displacement settings and located control windows, see set_extension
+        self.forget_extension_state()
         self.image_directory = image_directory
         self.default_directory = r"C:\Users\vchawla\OneDrive\Automation Tests\Trial 1"
         self.default_file_name = "_Results.csv"
         self.default_file_path = os.path.join(self.default_directory, self.default_file_name)
+        self.last_export_time = None  # Start of the last save_and_export_results, see wait_and_read_file
+
+    def set_text_entry_mode(self, mode, verify=None):
+        """
+        Switches how all text fields are filled in, see TextEntry.
+
+        Parameters:
+            mode (str): 'paste' (clipboard), 'fast' (typing without delay) or 'type' (0.1 s per key).
+            verify (bool, optional): Read back entries with OCR; unchanged if omitted.
+        """
+        self.text_entry.set_mode(mode)
+        if verify is not None:
+            self.text_entry.verify = verify
 
     def starting_tests(self, sample_name, t=2):
         """
         Automates the process of starting tests.
         """
-        dynamic_button_positions = self.locator.evaluate_dynamic_buttons(self.image_directory)
+        dynamic_button_positions = self.locator.locate_buttons(['sample1', 'sample_name'])
 
         # Perform actions to start the test
         pyautogui.click(dynamic_button_positions['sample1'][0], dynamic_button_positions['sample1'][1])
@@ -37,7 +74,7 @@ class Automation:
 
         pyautogui.click(dynamic_button_positions['sample_name'][0], dynamic_button_positions['sample_name'][1])
         time.sleep(t)
-        pyautogui.write(sample_name, interval=0.1)
+        self.text_entry.enter(sample_name, region=self.text_entry.region_around(dynamic_button_positions['sample_name']))
 
         continue_X, continue_Y = self.locator.get_button_coordinates('continue')
         pyautogui.click(continue_X, continue_Y)
@@ -45,8 +82,9 @@ class Automation:
         pyautogui.click(continue_X, continue_Y)
         time.sleep(t)
 
-        C_X, C_Y = self.locator.get_button_coordinates('C')
-        array_X, array_Y = self.locator.get_button_coordinates('array')
+        array_buttons = self.locator.locate_buttons(['C', 'array'])
+        C_X, C_Y = array_buttons['C']
+        array_X, array_Y = array_buttons['array']
 
         pyautogui.click(C_X, C_Y)
         time.sleep(t)
@@ -70,46 +108,99 @@ class Automation:
     def move(self, amount, direction, t=2, tt=4, time_trial=None, Backlash=None):
         """
         Automates the movement process by entering a number and clicking direction buttons.
+
+        Backlash: None applies the backlash correction only when the axis reverses its approach
+        direction, 'always' applies it after every move, and any other value skips it.
+        """
+        if direction not in MotionPlanner.AXES:
+            print("Invalid direction specified. Please use 'right', 'left', 'up', or 'down'.")
+            return
+        plan = self.plan_moves([(amount, direction)], t=t, tt=tt, Backlash=Backlash)
+        self.run_motion_plan(plan, t=t, tt=tt)
+
+    def move_sequence(self, moves, t=2, tt=4, Backlash=None):
         """
-        dynamic_button_positions = self.locator.evaluate_dynamic_buttons(self.image_directory)
+        Runs several relative moves, combining consecutive moves in the same direction into one.
+
+        Parameters:
+            moves (list of tuple): Moves as (amount, direction).
+
+        Returns:
+            MotionPlan: The plan that was run.
+        """
+        plan = self.plan_moves(moves, t=t, tt=tt, Backlash=Backlash)
+        self.run_motion_plan(plan, t=t, tt=tt)
+        return plan
+
+    def plan_moves(self, moves, t=2, tt=4, Backlash=None, merge=True):
+        """
+        Plans relative moves without running them, e.g. to compare the cost of campaigns.
+
+        Parameters:
+            moves (list of tuple): Moves as (amount, direction).
+            Backlash: Backlash mode as in move.
+            merge (bool): Combine consecutive moves in the same direction.
+
+        Returns:
+            MotionPlan: Planned UI operations with estimated_time in seconds.
+        """
+        backlash = "auto" if Backlash is None else "always" if Backlash == "always" else "never"
+        return self.motion_planner.plan(moves, t=t, tt=tt, merge=merge, backlash=backlash)
+
+    def run_motion_plan(self, plan, t=2, tt=4, pause=0):
+        """
+        Runs the UI operations of a MotionPlan and records the resulting approach directions.
+
+        Parameters:
+            pause (float): Extra delay in seconds after each move.
+        """
+        for operation in plan:
+            if operation["operation"] == "move":
+                # Predicted first, so the move can wait for the readout to reach it
+                self.stage.apply_move(operation["amount"], operation["direction"])
+                self._relative_move(operation["amount"], operation["direction"], t=t, tt=tt)
+                time.sleep(pause)
+            else:
+                self._backlash_correction()
+        self.motion_planner.record(plan)
+
+    def _relative_move(self, amount, direction, t=2, tt=4):
+        dynamic_button_positions = self.locator.locate_buttons(['right_click', 'move_relative'])
         # Right-click to open the context menu
         pyautogui.rightClick(dynamic_button_positions['right_click'][0], dynamic_button_positions['right_click'][1])
-        time.sleep(0.5)
+        time.sleep(0.5)  # No template shows the context menu, so this wait cannot be learned
 
         # Right-click on "move_relative"
         pyautogui.rightClick(dynamic_button_positions['move_relative'][0], dynamic_button_positions['move_relative'][1])
-        time.sleep(0.5)
+        self.timing.wait("open relative move", 0.5, until=f"{self.image_directory}/relative move.png")
 
         window_button_positions = self.locator.get_absolute_from_window_coordinates("relative move")
 
-        # Step 1: Click on the 'number' field
-        pyautogui.click(window_button_positions['number'][0], window_button_positions['number'][1])
-        time.sleep(t)
-
-        # Step 2: Clear current input and enter the new amount
-        pyautogui.hotkey('ctrl', 'a')
-        pyautogui.press('backspace')
-        time.sleep(t)
-        pyautogui.write(str(amount), interval=0.1)
-        time.sleep(t)
+        # Steps 1 and 2: Click on the 'number' field, clear it and enter the new amount
+        self._type_field(window_button_positions['number'], amount, t)
 
         # Step 3: Click the direction button
-        direction_buttons = ["right", "left", "up", "down"]
-        
-        if direction in direction_buttons:
-            pyautogui.click(window_button_positions[direction][0], window_button_positions[direction][1])
-        else:
-            print("Invalid direction specified. Please use 'right', 'left', 'up', or 'down'.")
-            return
+        pyautogui.click(window_button_positions[direction][0], window_button_positions[direction][1])
+        observable = self.stage.position is not None and None not in self.stage.position[:2]
+        self.timing.wait("stage move", tt, until=self._reached_predicted_position if observable else None)
 
-        time.sleep(tt)
+    def _reached_predicted_position(self):
+        """
+        Returns True once the X/Y readout shows the position predicted by the stage model.
+        """
+        predicted = self.stage.position
+        measured = self._read_xyz_positions()
+        return (None not in measured[:2] and abs(measured[0] - predicted[0]) <= self.stage.tolerance
+                and abs(measured[1] - predicted[1]) <= self.stage.tolerance)
 
-        # Step 4: Perform backlash correction
-        if Backlash is None:
-            pyautogui.rightClick(dynamic_button_positions['right_click'][0], dynamic_button_positions['right_click'][1])
-            time.sleep(4)
-            pyautogui.click(dynamic_button_positions['backlash'][0], dynamic_button_positions['backlash'][1])          
-            time.sleep(6)
+    def _backlash_correction(self):
+        dynamic_button_positions = self.locator.locate_buttons(['right_click', 'backlash'])
+        pyautogui.rightClick(dynamic_button_positions['right_click'][0], dynamic_button_positions['right_click'][1])
+        # Neither the menu nor the end of the correction can be observed (the stage returns to
+        # where it started), so these waits stay fixed
+        time.sleep(4)
+        pyautogui.click(dynamic_button_positions['backlash'][0], dynamic_button_positions['backlash'][1])
+        time.sleep(6)
         
     def move_in_increments(self, total_amount, direction, increment, t=2, tt=4, time_trial=None, Backlash=None):
         """
@@ -122,73 +213,81 @@ class Automation:
             t (int, optional): Time delay after each step. Default is 2.
             tt (int, optional): Time delay after each full step cycle. Default is 4.
             time_trial (optional): Additional parameter for future use. Default is None.
-            Backlash (optional): Specifies if backlash correction should be applied. Default is None.
+            Backlash (optional): Backlash mode as in move. By default the correction is only applied
+                                 if the first increment reverses the axis.
         """
+        steps = []
         remaining_amount = total_amount
-        
         while remaining_amount > 0:
             step_amount = min(remaining_amount, increment)
-            print(f"Moving {step_amount} in direction {direction}")
-            
-            # Call the move method with the step amount
-            self.move(step_amount, direction, t=t, tt=tt, time_trial=time_trial, Backlash=Backlash)
-            
-            # Subtract the step amount from the remaining amount
+            steps.append((step_amount, direction))
             remaining_amount -= step_amount
-            time.sleep(1)  # Small delay between steps for stability
+
+        # The increments are kept as separate commands
+        plan = self.plan_moves(steps, t=t, tt=tt, Backlash=Backlash, merge=False)
+        print(f"Moving {total_amount} in direction {direction} as {len(steps)} steps")
+        self.run_motion_plan(plan, t=t, tt=tt, pause=1)  # Small delay between steps for stability
 
         print(f"Movement of {total_amount} in {direction} direction completed in increments of {increment}.")
 
 
-    def wait_and_read_file(self, image_path, file_path=None, monitor_index=1, threshold=0.8):
+    def wait_and_read_file(self, image_path, file_path=None, monitor_index=1, threshold=0.8, settle=5, file_timeout=60,
+                           since=None):
         """
-        Waits for an image to appear on screen, then reads a CSV file.
+        Waits for an image to appear on screen, then reads a CSV file once a new version of it is complete.
+
+        Parameters:
+            since (float, optional): Time (as time.time()) the file has to be modified after. Defaults to
+                                     the start of the last save_and_export_results, or else to now, so a
+                                     results file left from a previous test is not read.
         """
         file_path = file_path or self.default_file_path
+        since = self.results_since(since)
 
-        while True:
-            time.sleep(10)
-            center_coords = self.locator.get_button_coordinates(image_path)
-            if center_coords:
-                print(f"Image '{image_path}' found at {center_coords}. Waiting for 1 more minute...")
-                time.sleep(10)
-                break
-            else:
-                print(f"Image '{image_path}' not found. Still waiting...")
-                time.sleep(10)
+        center_coords = self.locator.wait_for_button(image_path, appears=True, settle=settle, threshold=threshold)
+        print(f"Image '{image_path}' found at {center_coords}. Waiting for the results file...")
+        if not self.wait_for_file(file_path, timeout=file_timeout, newer_than=since):
+            return None, None
 
-        try:
-            print("Reading the results file...")
-            data = pd.read_csv(file_path, skiprows=[1])
-            cols_to_select = ['Hardness', 'Modulus', 'X', 'Y']
-            selected_data = data.loc[:, cols_to_select].iloc[:-3]
-            print("File read successfully:")
-            print(selected_data)
-        except Exception as e:
-            print(f"An error occurred while reading the file: {e}")
-        return data, selected_data
+        return self.read_results_file(file_path, self.NORMAL_RESULT_COLUMNS)
 
-    def wait_and_read_file_blitz(self, image_path, file_path=None, monitor_index=1, threshold=0.8):
+    def wait_and_read_file_blitz(self, image_path, file_path=None, monitor_index=1, threshold=0.8, settle=5, file_timeout=120,
+                                 since=None):
         """
-        Waits for an image to appear on screen, then reads a CSV file.
+        Waits for an image to appear on screen, then reads a CSV file once a new version of it is complete.
+        See wait_and_read_file for since.
         """
         file_path = file_path or self.default_file_path
+        since = self.results_since(since)
 
-        while True:
-            time.sleep(10)
-            center_coords = self.locator.get_button_coordinates(image_path)
-            if center_coords:
-                print(f"Image '{image_path}' found at {center_coords}. Waiting for 2 more minute...")
-                time.sleep(120)
-                break
-            else:
-                print(f"Image '{image_path}' not found. Still waiting...")
-                time.sleep(10)
+        center_coords = self.locator.wait_for_button(image_path, appears=True, settle=settle, threshold=threshold)
+        print(f"Image '{image_path}' found at {center_coords}. Waiting for the results file...")
+        if not self.wait_for_file(file_path, timeout=file_timeout, newer_than=since):
+            return None, None
 
+        return self.read_results_file(file_path, self.BLITZ_RESULT_COLUMNS)
+
+    def results_since(self, since=None):
+        """
+        Returns the time a results file has to be newer than: since if given, else the start of
+        the last export, else now.
+        """
+        if since is not None:
+            return since
+        return self.last_export_time if self.last_export_time is not None else time.time()
+
+    @staticmethod
+    def read_results_file(file_path, cols_to_select):
+        """
+        Reads an exported results CSV and selects the given columns.
+
+        Returns:
+            tuple: (data, selected_data) DataFrames, or (None, None) if the file could not be read.
+        """
+        data, selected_data = None, None
         try:
             print("Reading the results file...")
             data = pd.read_csv(file_path, skiprows=[1])
-            cols_to_select = ['X Position', 'Y Position', 'Z Position', 'MODULUS', 'HARDNESS']
             selected_data = data.loc[:, cols_to_select].iloc[:-3]
             print("File read successfully:")
             print(selected_data)
@@ -196,18 +295,74 @@ class Automation:
             print(f"An error occurred while reading the file: {e}")
         return data, selected_data
 
+    @staticmethod
+    def wait_for_file(file_path, settle=2, timeout=60, poll_interval=0.5, newer_than=None):
+        """
+        Waits until a file exists and its size and modification time have stopped changing.
+
+        Parameters:
+            file_path (str): File to wait for.
+            settle (float): Seconds the file must stay unchanged.
+            timeout (float): Seconds to wait before giving up.
+            poll_interval (float): Seconds between checks.
+            newer_than (float, optional): Time (as time.time()) the file must have been modified
+                                          after; older versions of the file are ignored.
+
+        Returns:
+            bool: True if the file is complete, False if the timeout expired.
+        """
+        start = time.monotonic()
+        last_state, stable_since = None, None
+        while True:
+            now = time.monotonic()
+            try:
+                stat = os.stat(file_path)
+                state = (stat.st_size, stat.st_mtime_ns)
+                if newer_than is not None and stat.st_mtime < newer_than:
+                    state = None  # Left from an earlier run
+            except OSError:
+                state = None
+
+            if state is not None and state == last_state:
+                if now - stable_since >= settle:
+                    return True
+            else:
+                last_state, stable_since = state, now
+
+            if now - start >= timeout:
+                print(f"No new, complete version of '{file_path}' after {timeout} seconds.")
+                return False
+            time.sleep(poll_interval)
+
+    def wait_for_engage(self, settle=10, appear_timeout=20):
+        """
+        Waits for the engage sequence to finish: the 'abort' button shows up while the
+        instrument is busy and has to stay gone for the settle window.
+        """
+        if self.locator.wait_for_button("abort", appears=True, timeout=appear_timeout) is None:
+            print("Image 'abort' did not appear. Checking that it stays absent...")
+        self.locator.wait_for_button("abort", appears=False, settle=settle)
+        print(f"Image 'abort' absent for {settle} seconds.")
+
+    def wait_for_test_completion(self, settle=5, start_timeout=30):
+        """
+        Waits for the 'start' button to come back once the indentation test has finished.
+        The button is first given start_timeout seconds to disappear, so a test that has
+        not started yet is not mistaken for a finished one.
+        """
+        self.locator.wait_for_button("start", appears=False, timeout=start_timeout)
+        center_coords = self.locator.wait_for_button("start", appears=True, settle=settle)
+        print(f"Image start found at {center_coords}.")
+        return center_coords
+
     @staticmethod
     def save_adjusted_centers_to_file(circle_centers, crosshair_x, crosshair_y, scale_x, scale_y, directory, filename="circle_centers.txt"):
         """
         Saves the adjusted centers of circles to a text file in the specified directory.
         """
-        os.makedirs(directory, exist_ok=True)
-        file_path = os.path.join(directory, filename)
-        with open(file_path, "w") as file:
-            for x, y in circle_centers:
-                adjusted_x = (x - crosshair_x)/scale_x
-                adjusted_y = (-y + crosshair_y)/scale_y
-                file.write(f"{adjusted_x}, {adjusted_y}\n")
+        # Offsets in microns from the crosshair; the stage Y axis points up the image
+        transform = StageTransform((crosshair_x, crosshair_y), (scale_x, scale_y), invert=(False, True))
+        file_path = transform.write_array_file(circle_centers, os.path.join(directory, filename))
         print(f"Adjusted centers saved to: {file_path}")
         return file_path
 
@@ -247,83 +402,139 @@ class Automation:
     def get_xyz_positions(self):
         """
         Extracts the XYZ positions (X Axis, Y Axis, Extension) using OCR on a captured screenshot.
+        Digits are read with the glyph templates of self.readout; Tesseract is only used when
+        the fields are not located yet or a glyph is not recognized. Every readout also verifies
+        and re-syncs the stage model (self.stage).
         """
+        return self.stage.observe(self._read_xyz_positions())
+
+    def current_position(self):
+        """
+        Returns the stage position (X, Y, Extension) predicted from the commanded moves and
+        extensions, and only reads it with OCR when the stage model asks for a verification.
+        """
+        if self.stage.needs_verification():
+            return self.get_xyz_positions()
+        return self.stage.position
+
+    def _read_xyz_positions(self):
         x1, y1, x2, y2 = self.locator.get_bounding_box(
             image_dir=self.image_directory, corner_1="Bbox_XYZ_1", corner_2="Bbox_XYZ_2"
         )
-        screenshot = ScreenUtils.capture_screen_area(x1, y1, x2, y2)
-        screenshot_np = np.array(screenshot)
-        ocr_result = pytesseract.image_to_string(screenshot_np, lang='eng')
-        # print(ocr_result)
-        return self.extract_coordinates(ocr_result)
+        screenshot_np = ScreenUtils.capture_screen_area_array(x1, y1, x2, y2)
+
+        # Unchanged readout pixels give the same positions as last time
+        ocr_key = (self.ocr_memo.digest(screenshot_np), "xyz_positions", "eng")
+        found, positions = self.ocr_memo.get(ocr_key)
+        if found:
+            return positions
+
+        # Fast path: match the value digits against the learned glyphs
+        positions = self.readout.read(screenshot_np)
+        if positions is None:
+            # Fall back to Tesseract, which also (re)locates the value fields and learns new glyphs
+            ocr_result = self.readout.calibrate(screenshot_np)
+            # print(ocr_result)
+            positions = self.extract_coordinates(ocr_result)
+
+        self.ocr_memo.put(ocr_key, positions)
+        return positions
 
     def set_extension(self, number, t=2):
         """
         Sets the extension value through the automation workflow.
+
+        The last confirmed extension and displacement and the located control windows are kept
+        in self.extension_state: setting the extension it already has (checked against a fresh
+        readout) returns immediately, and the raise displacement is only typed while it is not
+        applied yet.
         """
-        if number <= 11.01:
-            Z_control_X, Z_control_Y = self.locator.get_button_coordinates('Z control')
-            pyautogui.click(Z_control_X, Z_control_Y)
-            time.sleep(t)
+        if number > 11.01:
+            raise ValueError(f"Extension cannot be greater than 11. Given value: {number}")
 
-            Extension_positions = self.locator.get_absolute_from_window_coordinates(
-                "Extension control", relative_positions='extension'
-            )
-            displacement_positions = self.locator.get_absolute_from_window_coordinates(
-                "displacement window", relative_positions='displacement'
-            )
+        state = self.extension_state
+        # Read, not predicted: the cached setting is only trusted if the readout still shows it
+        Extension_origin = self.get_xyz_positions()[2]
+        if state["extension"] is not None and (Extension_origin is None
+                                               or round(Extension_origin, 3) != round(state["extension"], 3)):
+            state["extension"] = None  # The readout moved away from the last setting, e.g. by hand
+        if state["extension"] is not None and round(number, 3) == round(state["extension"], 3):
+            print(f"Extension already set to {number}.")
+            return
 
-            OriginX_small, OriginY_small, Extension_origin = self.get_xyz_positions()
-            if number > Extension_origin:
-                pyautogui.click(displacement_positions['displacement number'][0], displacement_positions['displacement number'][1])
-                time.sleep(t)
-                pyautogui.hotkey('ctrl', 'a')
-                pyautogui.press('backspace')
-                time.sleep(t)
-                pyautogui.write(str(12.5), interval=0.1)
-                time.sleep(t)
+        Z_control_X, Z_control_Y = self.locator.get_button_coordinates('Z control')
+        pyautogui.click(Z_control_X, Z_control_Y)
+        self.timing.wait("open Z control", t, until=f"{self.image_directory}/Extension control.png")
+
+        Extension_positions = self._window_buttons("Extension control", 'extension')
+        if Extension_origin is None or number > Extension_origin:
+            # Raising needs the displacement applied first
+            displacement_typed = state["displacement"] != self.RAISE_DISPLACEMENT
+            if displacement_typed:
+                displacement_positions = self._window_buttons("displacement window", 'displacement')
+                self._type_field(displacement_positions['displacement number'], self.RAISE_DISPLACEMENT, t)
                 pyautogui.click(displacement_positions['displacement set'][0], displacement_positions['displacement set'][1])
-                time.sleep(t)
-                pyautogui.click(Extension_positions['Extension number'][0], Extension_positions['Extension number'][1])
-                time.sleep(t)
-                pyautogui.hotkey('ctrl', 'a')
-                pyautogui.press('backspace')
-                time.sleep(t)
-                pyautogui.write(str(number), interval=0.1)
-                pyautogui.click(Extension_positions['Extension set'][0], Extension_positions['Extension set'][1])
-                time.sleep(t)
-                pyautogui.click(Extension_positions['Extension number'][0], Extension_positions['Extension number'][1])
-                time.sleep(t)
-                pyautogui.hotkey('ctrl', 'a')
-                pyautogui.press('backspace')
-                time.sleep(t)
-                pyautogui.write(str(0.00), interval=0.1)
-                time.sleep(t)
-                pyautogui.click(displacement_positions['displacement number'][0], displacement_positions['displacement number'][1])
-                time.sleep(t)
-                pyautogui.hotkey('ctrl', 'a')
-                pyautogui.press('backspace')
-                time.sleep(t)
-                pyautogui.write(str(0.0), interval=0.1)
-                time.sleep(t)
-            else:
-                pyautogui.click(Extension_positions['Extension number'][0], Extension_positions['Extension number'][1])
-                time.sleep(t)
-                pyautogui.hotkey('ctrl', 'a')
-                pyautogui.press('backspace')
-                time.sleep(t)
-                pyautogui.write(str(number), interval=0.1)
-                pyautogui.click(Extension_positions['Extension set'][0], Extension_positions['Extension set'][1])
-                time.sleep(t)
-                pyautogui.click(Extension_positions['Extension number'][0], Extension_positions['Extension number'][1])
-                time.sleep(t)
-                pyautogui.hotkey('ctrl', 'a')
-                pyautogui.press('backspace')
-                time.sleep(t)
-                pyautogui.write(str(0.00), interval=0.1)
-                time.sleep(t)
+                time.sleep(t)  # The applied displacement is not shown, so this wait cannot be learned
+                state["displacement"] = self.RAISE_DISPLACEMENT
+            self._type_field(Extension_positions['Extension number'], number, t, settle=False)
+            pyautogui.click(Extension_positions['Extension set'][0], Extension_positions['Extension set'][1])
+            self.timing.wait("set extension", t, until=lambda: self._reached_extension(number))
+            self._type_field(Extension_positions['Extension number'], 0.00, t)
+            if displacement_typed:
+                self._type_field(displacement_positions['displacement number'], 0.0, t)
         else:
-            raise ValueError(f"Extension cannot be greater than 11. Given value: {number}")
+            self._type_field(Extension_positions['Extension number'], number, t, settle=False)
+            pyautogui.click(Extension_positions['Extension set'][0], Extension_positions['Extension set'][1])
+            self.timing.wait("set extension", t, until=lambda: self._reached_extension(number))
+            self._type_field(Extension_positions['Extension number'], 0.00, t)
+        state["extension"] = number
+        self.stage.apply_extension(number)
+
+    def _reached_extension(self, number):
+        """
+        Returns True once the extension readout shows the given extension.
+        """
+        extension = self._read_xyz_positions()[2]
+        return extension is not None and abs(extension - number) <= self.focus_tolerance
+
+    def _type_field(self, position, value, t, settle=True):
+        """
+        Clicks a text field, clears it and types the value. With settle, also waits until the
+        field shows the value.
+        """
+        # Focusing and clearing the field show nothing that can be read reliably, so these waits stay fixed
+        pyautogui.click(position[0], position[1])
+        time.sleep(t)
+        pyautogui.hotkey('ctrl', 'a')
+        pyautogui.press('backspace')
+        time.sleep(t)
+        region = self.text_entry.region_around(position)
+        self.text_entry.enter(value, region=region)
+        if settle:
+            self.timing.wait("type field", t, until=lambda: self.text_entry.check(str(value), region))
+
+    def _window_buttons(self, window_image_name, relative_positions):
+        """
+        Returns the button coordinates of an extension control window. The coordinates are kept
+        until forget_extension_state() is called, but only reused while the window's template is
+        still found at the same place (a cheap match around its last position).
+        """
+        windows = self.extension_state["windows"]
+        edges = ScreenUtils.find_image_edges_on_screen(f"{self.image_directory}/{window_image_name}.png")
+        if window_image_name not in windows or windows[window_image_name][0] != edges:
+            # Not located yet, moved or closed (in which case locating it raises)
+            coordinates = self.locator.get_absolute_from_window_coordinates(
+                window_image_name, relative_positions=relative_positions
+            )
+            windows[window_image_name] = (edges, coordinates)
+        return windows[window_image_name][1]
+
+    def forget_extension_state(self):
+        """
+        Forgets the confirmed extension and displacement and the window positions, e.g. after
+        the controls were used or moved by hand.
+        """
+        self.extension_state = {"extension": None, "displacement": None, "windows": {}}
 
     def engage(self):
         """
@@ -331,52 +542,84 @@ class Automation:
         """
         Z_control_X, Z_control_Y = self.locator.get_button_coordinates('Z control')
         pyautogui.click(Z_control_X, Z_control_Y)
-        time.sleep(2)
+        self.timing.wait("open Z control", 2, until=f"{self.image_directory}/Extension control.png")
 
-        Extension_positions = self.locator.get_absolute_from_window_coordinates(
-            "Extension control", relative_positions='extension'
-        )
+        Extension_positions = self._window_buttons("Extension control", 'extension')
         pyautogui.click(Extension_positions['Engage'][0], Extension_positions['Engage'][1])
 
-    def align_focus(self):
+        # Engaging moves the tip, so the extension has to be read again
+        self.extension_state["extension"] = None
+        self.stage.apply_extension(None)
+
+    def align_focus(self, points=3, model="plane", smoothing=0.0):
         """
-        Guides the user to move to three positions and collects XYZ coordinates.
-        Returns the parameters of linear interpolation for Z based on X and Y.
+        Guides the user to move to a number of focused positions and collects their XYZ coordinates.
+        Returns the focus surface fit to them by least squares.
+
+        Parameters:
+            points (int): Number of positions to sample (at least 3, 6 for the quadratic model).
+            model (str): 'plane', 'quadratic' or 'thin_plate', see FocusSurface.
+            smoothing (float): Smoothing of the thin-plate model.
+
+        Returns:
+            FocusSurface: The fitted surface.
         """
-        print("Please move to the first position and confirm to collect XYZ.")
-        input("Press Enter to continue...")
-        x1, y1, z1 = self.get_xyz_positions()
+        surface = FocusSurface(model, smoothing=smoothing)
+        if points < FocusSurface.MIN_POINTS[model]:
+            raise ValueError(f"The {model} focus surface needs at least {FocusSurface.MIN_POINTS[model]} points.")
 
-        print("Please move to the second position and confirm to collect XYZ.")
-        input("Press Enter to continue...")
-        x2, y2, z2 = self.get_xyz_positions()
+        samples = []
+        for index in range(points):
+            print(f"Please move to position {index + 1} of {points} and confirm to collect XYZ.")
+            input("Press Enter to continue...")
+            samples.append(self.get_xyz_positions())
 
-        print("Please move to the third position and confirm to collect XYZ.")
-        input("Press Enter to continue...")
-        x3, y3, z3 = self.get_xyz_positions()
+        surface.fit(samples)
+        print(f"Focus surface: {surface}, RMS residual {surface.rms_residual():.4f}")
+        return surface
 
-        # Perform linear interpolation to calculate plane parameters
-        A = np.array([
-            [x1, y1, 1],
-            [x2, y2, 1],
-            [x3, y3, 1]
-        ])
-        b = np.array([z1, z2, z3])
+    def focus(self, surface, tolerance=None):
+        """
+        Focuses by predicting the Z position for the current X and Y and sets the extension accordingly.
 
-        plane_params = np.linalg.solve(A, b)
-        print("Linear interpolation parameters (Z = ax + by + c):", plane_params)
+        Parameters:
+            surface (FocusSurface or list): Focus surface, or plane parameters [a, b, c].
+            tolerance (float, optional): See focus_to.
 
-        return plane_params  # Returns [a, b, c]
+        Returns:
+            bool: Whether the extension was changed.
+        """
+        x, y, _ = self.current_position()
+        z = round(float(FocusSurface.as_surface(surface).predict((x, y))[0]), 3)
+        print(f"Calculated Z for X={x}, Y={y} is Z={z}")
+        return self.focus_to(z, tolerance=tolerance)
 
-    def focus(self, plane_params):
+    def autofocus(self, low=0.0, high=11.0):
         """
-        Focuses by calculating the Z position for the given X and Y and sets the extension accordingly.
+        Focuses on the sharpest micro camera view with the extension in [low, high], see Autofocus.run.
+
+        Returns:
+            tuple: (best extension, its sharpness, number of captures).
         """
-        a, b, c = plane_params
-        x, y, z2 = self.get_xyz_positions()
-        z = round(a * x + b * y + c, 3)
-        print(f"Calculated Z for X={x}, Y={y} is Z={z}")
+        return self.autofocuser.run(low, high)
+
+    def focus_to(self, z, tolerance=None):
+        """
+        Sets the extension to z, unless it differs from the current extension by no more than the tolerance.
+
+        Parameters:
+            z (float): Target extension.
+            tolerance (float, optional): Largest change that is skipped. Defaults to self.focus_tolerance.
+
+        Returns:
+            bool: Whether the extension was changed.
+        """
+        tolerance = self.focus_tolerance if tolerance is None else tolerance
+        extension = self.current_position()[2]
+        if extension is not None and abs(z - extension) <= tolerance:
+            return False
         self.set_extension(z)
+        return True
 
     def change_method(self, method='normal'):
         """
@@ -407,6 +650,7 @@ class Automation:
             file_path_imicro (str): The file path to be entered during the 'Save As' step.
             random_name (str): The random name to be used for saving the file.
         """
+        self.last_export_time = time.time()
         # Step 1: Click on 'Review Data'
         review_data_X, review_data_Y = self.locator.get_button_coordinates('review data')
         pyautogui.click(review_data_X, review_data_Y)
@@ -441,7 +685,7 @@ class Automation:
         pyautogui.hotkey('ctrl', 'a')
         pyautogui.press('backspace')
         time.sleep(2)
-        pyautogui.write(file_path_imicro, interval=0.1)
+        self.text_entry.enter(file_path_imicro)  # Checked by the export file appearing, not by OCR
         time.sleep(2)
         pyautogui.press('enter')
 
@@ -461,7 +705,7 @@ class Automation:
         pyautogui.hotkey('ctrl', 'a')
         pyautogui.press('backspace')
         time.sleep(2)
-        pyautogui.write(random_name, interval=0.1)
+        self.text_entry.enter(random_name, region=self.text_entry.region_around((click_x, click_y)))
         time.sleep(2)
 
         save_for_saving_X, save_for_saving_Y = self.locator.get_button_coordinates('save for saving')
@@ -495,22 +739,7 @@ class Automation:
             name=random_name
         # Engage
         self.engage()
-        while True:
-             time.sleep(10)
-             center_coords = self.locator.get_button_coordinates("abort")
-             
-             if not center_coords:
-                   print(f"Image 'abort' not found. Rechecking in 10 seconds...")
-                   time.sleep(10)
-                   center_coords_second_check = self.locator.get_button_coordinates("abort")
-                   if not center_coords_second_check:
-                         print(f"Image 'abort' confirmed as not present. Waiting for 30 more seconds...")
-                         time.sleep(30)
-                         break
-                   else:
-                          print("Second check failed. Restarting wait loop...")
-             else:
-                   print("Image 'abort' found. Still waiting for it to disappear...")
+        self.wait_for_engage()
                    
         # Click the "start" button
         start_X, start_Y = self.locator.get_button_coordinates("start")
@@ -533,23 +762,13 @@ class Automation:
         pyautogui.hotkey('ctrl', 'a')
         pyautogui.press('backspace')
         time.sleep(2)
-        pyautogui.write(name, interval=0.1)
+        self.text_entry.enter(name, region=self.text_entry.region_around((click_x, click_y)))
         time.sleep(2)
         
         save_X, save_Y = self.locator.get_button_coordinates("save")  
         pyautogui.click(save_X, save_Y)
 		# Now the test is started
-        
-        while True:
-            time.sleep(10)
-            center_coords = self.locator.get_button_coordinates('start')
-            if center_coords:
-                print(f"Image start found at {center_coords}. Waiting for 1 more minute...")
-                time.sleep(60)
-                break
-            else:
-                print(f"Image start not found. Still waiting...")
-                time.sleep(60) 
+        self.wait_for_test_completion()
                 
         # Set extension to 10
         self.set_extension(10, t=2)
@@ -557,11 +776,13 @@ class Automation:
 
     def starting_tests_circles(self, sample_name, t=2):
         
-        Add_X,Add_Y = self.locator.get_button_coordinates('add')
-        Edit_X, Edit_Y= self.locator.get_button_coordinates('edit')
-        Remove_X, Remove_Y= self.locator.get_button_coordinates('remove')
-        ClearAll_X, ClearAll_Y= self.locator.get_button_coordinates('clear all')
-        dynamic_button_positions = self.locator.evaluate_dynamic_buttons(self.image_directory)
+        dynamic_button_positions = self.locator.locate_buttons(
+            ['add', 'edit', 'remove', 'clear all', 'sample1', 'sample_name']
+        )
+        Add_X,Add_Y = dynamic_button_positions['add']
+        Edit_X, Edit_Y= dynamic_button_positions['edit']
+        Remove_X, Remove_Y= dynamic_button_positions['remove']
+        ClearAll_X, ClearAll_Y= dynamic_button_positions['clear all']
         
         # Perform the sequence of actions
         time.sleep(t)
@@ -574,7 +795,7 @@ class Automation:
         pyautogui.click(dynamic_button_positions['sample_name'][0], dynamic_button_positions['sample_name'][1])
         
         time.sleep(t)        
-        pyautogui.write(sample_name, interval=0.1)
+        self.text_entry.enter(sample_name, region=self.text_entry.region_around(dynamic_button_positions['sample_name']))
         continue_X,continue_Y = self.locator.get_button_coordinates('continue') 
         
         pyautogui.click(continue_X, continue_Y)
@@ -583,8 +804,9 @@ class Automation:
         pyautogui.click(continue_X, continue_Y)
         time.sleep(t)
         
-        C_X, C_Y=self.locator.get_button_coordinates('C')
-        array_X, array_Y = self.locator.get_button_coordinates('array')  
+        array_buttons = self.locator.locate_buttons(['C', 'array'])
+        C_X, C_Y = array_buttons['C']
+        array_X, array_Y = array_buttons['array']
         
         pyautogui.click(C_X, C_Y)
         time.sleep(t)
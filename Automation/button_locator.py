@@ -3,6 +3,8 @@ from screen_utils import ScreenUtils
 class ButtonLocator:
     def __init__(self, image_directory):
         self.image_directory = image_directory
+        # Decode every button template once up front; later lookups hit the shared registry
+        ScreenUtils.templates.preload(image_directory)
 
         # Default relative positions for window-based buttons
         self.default_relative_positions = [
@@ -54,6 +56,17 @@ class ButtonLocator:
         image_path = f"{self.image_directory}/{button_name}.png"
         return ScreenUtils.find_image_center_on_screen(image_path)
 
+    def wait_for_button(self, button_name, appears=True, **kwargs):
+        """
+        Waits until a button appears on (or disappears from) the screen.
+        Keyword arguments are passed to ScreenUtils.wait_until (timeout, settle, poll_interval, ...).
+
+        Returns:
+            tuple or bool: Button center when it appeared, True when it disappeared, None on timeout.
+        """
+        image_path = f"{self.image_directory}/{button_name}.png"
+        return ScreenUtils.wait_until(image_path, appears=appears, **kwargs)
+
     def get_absolute_from_window_coordinates(self, window_image_name, 
                                              relative_positions=None, 
                                              button_names=None):
@@ -130,18 +143,79 @@ class ButtonLocator:
 
         return abs_x, abs_y
 
+    def locate_buttons(self, buttons, anchors=("puck 2", "start")):
+        """
+        Resolves many buttons from a single screenshot. Every distinct template
+        (anchors included) is matched once against the same frame.
+
+        Parameters:
+            buttons (list): Each entry is either
+                            - the name of a dynamically evaluated button (e.g. 'right_click'),
+                              derived from the default anchor pair,
+                            - a (button_name, (anchor_1, anchor_2)) pair to use other anchors, or
+                            - the name of a plain button image (e.g. 'add'), whose center is returned.
+            anchors (tuple of str): Default anchor image names for dynamic buttons.
+
+        Returns:
+            dict: Button names mapped to their absolute (x, y) coordinates. Plain buttons that
+                  are not visible map to None, like get_button_coordinates.
+        """
+        requests = []
+        for button in buttons:
+            if isinstance(button, (tuple, list)):
+                button_name, button_anchors = button
+                requests.append((button_name, tuple(button_anchors)))
+            elif button in self.dynamic_relative_positions:
+                requests.append((button, tuple(anchors)))
+            else:
+                requests.append((button, None))
+
+        image_names = []
+        for button_name, button_anchors in requests:
+            image_names.extend(button_anchors if button_anchors else [button_name])
+        image_paths = {name: f"{self.image_directory}/{name}.png" for name in image_names}
+        matches = ScreenUtils.locate_images_on_screen(list(image_paths.values()))
+
+        coordinates = {}
+        for button_name, button_anchors in requests:
+            if button_anchors is None:
+                coordinates[button_name] = ScreenUtils.center_of(matches[image_paths[button_name]])
+                continue
+
+            if button_name not in self.dynamic_relative_positions:
+                raise ValueError(f"Button '{button_name}' is not defined in dynamic relative positions.")
+            absolute_position = ScreenUtils.absolute_from_anchor_centers(
+                ScreenUtils.center_of(matches[image_paths[button_anchors[0]]]),
+                ScreenUtils.center_of(matches[image_paths[button_anchors[1]]]),
+                [self.dynamic_relative_positions[button_name]]
+            )
+            coordinates[button_name] = (absolute_position["button_0_X"], absolute_position["button_0_Y"])
+
+        return coordinates
+
     def evaluate_dynamic_buttons(self, image_dir):
         """
         Evaluate all dynamically defined buttons by calculating their absolute positions
         from relative positions and the two reference images.
         """
+        return self._evaluate_from_anchors(image_dir, self.dynamic_button_order)
+
+    def _evaluate_from_anchors(self, image_dir, button_names):
+        """
+        Locates the 'puck 2' and 'start' anchors once and derives every requested dynamic button from them.
+        """
+        anchors = (f"{image_dir}/puck 2.png", f"{image_dir}/start.png")
+        matches = ScreenUtils.locate_images_on_screen(anchors)
+        absolute_positions = ScreenUtils.absolute_from_anchor_centers(
+            ScreenUtils.center_of(matches[anchors[0]]),
+            ScreenUtils.center_of(matches[anchors[1]]),
+            [self.dynamic_relative_positions[name] for name in button_names]
+        )
+
         button_positions = {}
-        image_path1 = f"{image_dir}/puck 2.png"
-        image_path2 = f"{image_dir}/start.png"
-        for button_name in self.dynamic_button_order:
-            button_positions[button_name] = self.get_absolute_from_dynamic_coordinates(
-                button_name, image_path1, image_path2
-            )
+        for i, button_name in enumerate(button_names):
+            button_positions[button_name] = (absolute_positions[f"button_{i}_X"],
+                                             absolute_positions[f"button_{i}_Y"])
         return button_positions
 
     def get_bounding_box(self, image_dir, corner_1="XY1", corner_2="XY2"):
@@ -157,16 +231,11 @@ class ButtonLocator:
         Returns:
             tuple: (x1, y1, x2, y2) representing the bounding box.
         """
-        # Get absolute positions for the specified corners
-        xy1_abs = self.get_absolute_from_dynamic_coordinates(corner_1, 
-                                                             f"{image_dir}/puck 2.png", 
-                                                             f"{image_dir}/start.png")
-        xy2_abs = self.get_absolute_from_dynamic_coordinates(corner_2, 
-                                                             f"{image_dir}/puck 2.png", 
-                                                             f"{image_dir}/start.png")
+        # Get absolute positions for both corners from a single screenshot
+        corners = self._evaluate_from_anchors(image_dir, [corner_1, corner_2])
 
-        x1, y1 = xy1_abs  # Top-left corner
-        x2, y2 = xy2_abs  # Bottom-right corner
+        x1, y1 = corners[corner_1]  # Top-left corner
+        x2, y2 = corners[corner_2]  # Bottom-right corner
 
         return x1, y1, x2, y2
     
@@ -0,0 +1,127 @@
+import numpy as np
+from scipy.interpolate import RBFInterpolator
+
+
+class FocusSurface:
+    # Model -> minimum number of sampled points
+    MIN_POINTS = {"plane": 3, "quadratic": 6, "thin_plate": 3}
+
+    def __init__(self, model="plane", smoothing=0.0):
+        """
+        Focus height Z (extension) of the sample as a function of the stage position (X, Y).
+
+        The plane and quadratic models are fit by least squares over any number of sampled
+        points; the thin-plate model follows warped samples through a thin-plate spline
+        (exact at the samples unless smoothing is given). Coordinates are centered and
+        scaled before fitting, so stage positions in the tens of millimetres stay well conditioned.
+
+        Parameters:
+            model (str): 'plane' (Z = aX + bY + c), 'quadratic' (adds X², XY and Y²) or 'thin_plate'.
+            smoothing (float): Smoothing of the thin-plate spline (0 interpolates the samples).
+        """
+        if model not in self.MIN_POINTS:
+            raise ValueError(f"Unknown focus surface model: {model}. Use 'plane', 'quadratic' or 'thin_plate'.")
+        self.model = model
+        self.smoothing = smoothing
+        self.points = None
+        self.center = np.zeros(2)
+        self.spread = 1.0
+        self.coefficients = None
+        self.spline = None
+        self.residuals = None
+
+    @classmethod
+    def as_surface(cls, params):
+        """
+        Returns params itself if it is a FocusSurface, otherwise the plane Z = aX + bY + c
+        with the parameters [a, b, c] (as returned by earlier versions of align_focus).
+        """
+        if isinstance(params, cls):
+            return params
+        surface = cls("plane")
+        surface.coefficients = np.asarray(params, dtype=float).reshape(3)
+        return surface
+
+    def fit(self, points):
+        """
+        Fits the surface to sampled focus positions.
+
+        Parameters:
+            points (array-like): Sampled positions (X, Y, Z), shape (N, 3).
+
+        Returns:
+            FocusSurface: self, fitted.
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        if len(points) < self.MIN_POINTS[self.model]:
+            raise ValueError(f"The {self.model} focus surface needs at least {self.MIN_POINTS[self.model]} points, "
+                             f"got {len(points)}.")
+        self.points = points
+        self.center = points[:, :2].mean(axis=0)
+        self.spread = float(np.abs(points[:, :2] - self.center).max()) or 1.0
+        normalized = self._normalize(points[:, :2])
+
+        if self.model == "thin_plate":
+            self.spline = RBFInterpolator(normalized, points[:, 2], kernel="thin_plate_spline",
+                                          smoothing=self.smoothing, degree=1)
+        else:
+            design = self._design_matrix(normalized)
+            if np.linalg.matrix_rank(design) < design.shape[1]:
+                raise ValueError("The sampled focus points are degenerate (e.g. collinear); sample spread-out positions.")
+            normalized_coefficients = np.linalg.lstsq(design, points[:, 2], rcond=None)[0]
+            self.coefficients = self._denormalize(normalized_coefficients) if self.model == "plane" else normalized_coefficients
+
+        self.residuals = points[:, 2] - self.predict(points[:, :2])
+        return self
+
+    def _normalize(self, xy):
+        return (xy - self.center) / self.spread
+
+    def _design_matrix(self, normalized):
+        x, y = normalized[:, 0], normalized[:, 1]
+        columns = [x, y, np.ones_like(x)]
+        if self.model == "quadratic":
+            columns += [x * x, x * y, y * y]
+        return np.column_stack(columns)
+
+    def _denormalize(self, coefficients):
+        # Plane coefficients on stage coordinates, so that they read as Z = aX + bY + c
+        a, b, c = coefficients
+        a, b = a / self.spread, b / self.spread
+        return np.array([a, b, c - a * self.center[0] - b * self.center[1]])
+
+    def predict(self, xy):
+        """
+        Predicts Z for any number of stage positions in one call.
+
+        Parameters:
+            xy (array-like): Stage positions (X, Y), shape (N, 2).
+
+        Returns:
+            numpy.ndarray: Predicted Z, shape (N,).
+        """
+        xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+        if self.model == "thin_plate":
+            if self.spline is None:
+                raise ValueError("The focus surface has not been fit.")
+            return self.spline(self._normalize(xy))
+        if self.coefficients is None:
+            raise ValueError("The focus surface has not been fit.")
+        if self.model == "plane":
+            return xy @ self.coefficients[:2] + self.coefficients[2]
+        return self._design_matrix(self._normalize(xy)) @ self.coefficients
+
+    def rms_residual(self):
+        """
+        Returns the root mean square of the fit residuals (0 for an exact fit).
+        """
+        if self.residuals is None or not len(self.residuals):
+            return 0.0
+        return float(np.sqrt(np.mean(self.residuals ** 2)))
+
+    def __repr__(self):
+        if self.model == "plane" and self.coefficients is not None:
+            a, b, c = self.coefficients
+            return f"FocusSurface(Z = {a:.6g}X + {b:.6g}Y + {c:.6g})"
+        count = 0 if self.points is None else len(self.points)
+        return f"FocusSurface({self.model}, {count} points)"
@@ -0,0 +1,171 @@
+import os
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+class FrameSource:
+    # cv2 conversion codes from the raw BGRA frame
+    _CONVERSIONS = {"gray": cv2.COLOR_BGRA2GRAY, "rgb": cv2.COLOR_BGRA2RGB}
+
+    def __init__(self, pool_size=3, max_pooled_shapes=8):
+        """
+        Base class of everything ScreenUtils can take frames from.
+        Subclasses implement monitor() and _grab_bgra().
+
+        Parameters:
+            pool_size (int): Number of preallocated buffers per frame shape. A pooled frame is
+                             overwritten after pool_size further captures of the same shape, so
+                             copy it if it has to live longer than that.
+            max_pooled_shapes (int): Number of distinct frame shapes that keep a buffer pool.
+        """
+        self.pool_size = pool_size
+        self.max_pooled_shapes = max_pooled_shapes
+        self._pools = OrderedDict()  # shape -> [buffers, next index]
+        self.captures = 0
+
+    def monitor(self, monitor_index):
+        """
+        Returns the geometry dictionary (left, top, width, height) of a monitor in screen coordinates.
+        """
+        raise NotImplementedError
+
+    def _grab_bgra(self, region):
+        """
+        Returns the BGRA pixels of a region given as a geometry dictionary.
+        """
+        raise NotImplementedError
+
+    def grab(self, region, mode="bgra", pooled=True):
+        """
+        Captures a region of the screen.
+
+        Parameters:
+            region (int or dict): Monitor index, or a dictionary with 'left', 'top', 'width', 'height'.
+            mode (str): 'bgra' returns the frame without copying it,
+                        'gray' and 'rgb' convert directly into an output buffer.
+            pooled (bool): Convert into a preallocated pool buffer instead of a new array.
+
+        Returns:
+            numpy.ndarray: The captured frame.
+        """
+        if isinstance(region, int):
+            region = self.monitor(region)
+        bgra = self._grab_bgra(region)
+        self.captures += 1
+        if mode == "bgra":
+            return bgra
+
+        if mode not in self._CONVERSIONS:
+            raise ValueError(f"Unknown capture mode '{mode}'. Use 'bgra', 'gray' or 'rgb'.")
+        height, width = bgra.shape[:2]
+        shape = (height, width) if mode == "gray" else (height, width, 3)
+        dst = self._buffer(shape) if pooled else None
+        return cv2.cvtColor(bgra, self._CONVERSIONS[mode], dst=dst)
+
+    def _buffer(self, shape):
+        pool = self._pools.get(shape)
+        if pool is None:
+            pool = [[np.empty(shape, dtype=np.uint8) for _ in range(self.pool_size)], 0]
+            self._pools[shape] = pool
+            while len(self._pools) > self.max_pooled_shapes:
+                self._pools.popitem(last=False)
+        else:
+            self._pools.move_to_end(shape)
+
+        buffers, index = pool
+        pool[1] = (index + 1) % len(buffers)
+        return buffers[index]
+
+    def close(self):
+        """
+        Releases the source and drops the buffer pools.
+        """
+        self._pools.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ReplayFrameSource(FrameSource):
+    def __init__(self, frames, left=1920, top=0, auto_advance=False, loop=True, pool_size=3):
+        """
+        Serves frames from PNG files instead of the live screen, so the vision pipeline
+        can be benchmarked and regression-tested without the iMicro UI.
+
+        Parameters:
+            frames (str or list of str): A PNG file, a directory of recorded PNG frames
+                                         (replayed in file-name order), or a list of PNG files.
+            left, top (int): Screen position of the replayed monitor. The default matches the
+                             iMicro UI on monitor 2 to the right of a 1920-pixel primary monitor.
+            auto_advance (bool): Move to the next frame after every full-monitor grab.
+            loop (bool): Restart from the first frame after the last one.
+        """
+        super().__init__(pool_size=pool_size)
+        if isinstance(frames, str):
+            if os.path.isdir(frames):
+                frames = [os.path.join(frames, name) for name in sorted(os.listdir(frames))
+                          if name.lower().endswith(".png")]
+            else:
+                frames = [frames]
+        if not frames:
+            raise ValueError("No frames to replay.")
+
+        self.frames = [self._load(path) for path in frames]
+        self.left = left
+        self.top = top
+        self.auto_advance = auto_advance
+        self.loop = loop
+        self.frame_index = 0
+
+    @staticmethod
+    def _load(path):
+        image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if image is None:
+            raise ValueError(f"Could not load image at {path}")
+        if image.ndim == 2:
+            return cv2.cvtColor(image, cv2.COLOR_GRAY2BGRA)
+        if image.shape[2] == 3:
+            return cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
+        return image
+
+    def monitor(self, monitor_index):
+        """
+        Returns the geometry of the replayed monitor. Replays hold a single monitor,
+        so every index maps to it.
+        """
+        height, width = self.frames[self.frame_index].shape[:2]
+        return {"left": self.left, "top": self.top, "width": width, "height": height}
+
+    def next_frame(self):
+        """
+        Advances to the next recorded frame.
+
+        Returns:
+            bool: False if the replay is at its last frame and does not loop.
+        """
+        if self.frame_index + 1 < len(self.frames):
+            self.frame_index += 1
+            return True
+        if self.loop:
+            self.frame_index = 0
+            return True
+        return False
+
+    def _grab_bgra(self, region):
+        frame = self.frames[self.frame_index]
+        x1 = int(region["left"]) - self.left
+        y1 = int(region["top"]) - self.top
+        x2 = x1 + int(region["width"])
+        y2 = y1 + int(region["height"])
+        if x1 < 0 or y1 < 0 or x2 > frame.shape[1] or y2 > frame.shape[0]:
+            raise ValueError(f"Region {region} lies outside the replayed frame.")
+
+        whole_monitor = (x1, y1, x2, y2) == (0, 0, frame.shape[1], frame.shape[0])
+        if whole_monitor and self.auto_advance:
+            self.next_frame()
+        return frame[y1:y2, x1:x2]
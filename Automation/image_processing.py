@@ -123,6 +123,66 @@ class ImageProcessing:
 
         return detected_circles, detected_circles_with_radius
 
+    @staticmethod
+    def detect_circles_in_blocks(image, radius_range, X_scale, Y_scale, region=None, block_size=2048):
+        """
+        Runs detect_circles_with_contours block by block over a large image, reading one block at
+        a time, so a TiledImage never has to be loaded whole. Blocks overlap by the largest circle
+        diameter and each circle is reported once, by the block whose core contains its center.
+        Brightness normalization and the Otsu threshold are computed per block.
+
+        Parameters:
+            image (numpy.ndarray or TiledImage): Input image (grayscale or color).
+            radius_range (tuple): Min and max radius of circles in microns.
+            X_scale, Y_scale (float): Pixels per micron.
+            region (tuple, optional): (x1, y1, x2, y2) region to search. Defaults to the whole image.
+            block_size (int): Side of the block cores in pixels.
+
+        Returns:
+            tuple: List of detected centers (x, y), and list of circles (x, y, radius), in image pixels.
+        """
+        height, width = image.shape[:2]
+        x1, y1, x2, y2 = region if region is not None else (0, 0, width, height)
+        margin = int(np.ceil(2 * radius_range[1] * max(X_scale, Y_scale))) + 2
+
+        detected_circles = []
+        detected_circles_with_radius = []
+        for core_y in range(y1, y2, block_size):
+            for core_x in range(x1, x2, block_size):
+                read_x, read_y = max(0, core_x - margin), max(0, core_y - margin)
+                block = image[read_y:min(height, core_y + block_size + margin),
+                              read_x:min(width, core_x + block_size + margin)]
+                _, circles = ImageProcessing.detect_circles_with_contours(block, radius_range, X_scale, Y_scale)
+                for x, y, radius in circles:
+                    x, y = x + read_x, y + read_y
+                    if core_x <= x < min(core_x + block_size, x2) and core_y <= y < min(core_y + block_size, y2):
+                        detected_circles_with_radius.append((x, y, radius))
+                        detected_circles.append((x, y))
+
+        return detected_circles, detected_circles_with_radius
+
+    @staticmethod
+    def sharpness(image, max_size=256):
+        """
+        Scores the focus of an image as the variance of its Laplacian; sharper images score higher.
+        The image is area-downsampled first, so scoring a camera view takes a few milliseconds.
+
+        Parameters:
+            image (numpy.ndarray): RGB or grayscale image.
+            max_size (int): Larger side in pixels the image is downsampled to before scoring.
+
+        Returns:
+            float: The focus score.
+        """
+        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY) if image.ndim == 3 else image
+        height, width = gray.shape
+        factor = max(height, width) / max_size
+        if factor > 1:
+            gray = cv2.resize(gray, (max(1, round(width / factor)), max(1, round(height / factor))),
+                              interpolation=cv2.INTER_AREA)
+        _, deviation = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_32F))
+        return float(deviation[0, 0] ** 2)
+
     @staticmethod
     def visualize_detected_circles(image, circles_with_radius):
         """
@@ -0,0 +1,76 @@
+class LocationHintCache:
+    def __init__(self, padding=40):
+        """
+        Remembers where each template was last found so the next search can start there.
+
+        Parameters:
+            padding (int): Pixels added on every side of the last hit when building the search region.
+        """
+        self.padding = padding
+        self._hints = {}  # key -> (top_left_x, top_left_y, width, height) in monitor pixels
+        self.hits = 0
+        self.misses = 0
+
+    def search_region(self, key, screen_shape):
+        """
+        Returns the padded region around the last hit of key, clipped to the screen.
+
+        Parameters:
+            key (str): Template identifier (its image path).
+            screen_shape (tuple): Shape of the captured screen (height, width).
+
+        Returns:
+            tuple: (x1, y1, x2, y2) in monitor pixels, or None if there is no usable hint.
+        """
+        hint = self._hints.get(key)
+        if hint is None:
+            return None
+
+        top_left_x, top_left_y, width, height = hint
+        screen_height, screen_width = screen_shape[:2]
+        x1 = max(0, top_left_x - self.padding)
+        y1 = max(0, top_left_y - self.padding)
+        x2 = min(screen_width, top_left_x + width + self.padding)
+        y2 = min(screen_height, top_left_y + height + self.padding)
+        if x2 - x1 < width or y2 - y1 < height:
+            return None
+        return x1, y1, x2, y2
+
+    def update(self, key, top_left_x, top_left_y, width, height):
+        """
+        Stores the latest hit of key.
+        """
+        self._hints[key] = (top_left_x, top_left_y, width, height)
+
+    def forget(self, key=None):
+        """
+        Drops the hint for key, or every hint when key is None.
+        """
+        if key is None:
+            self._hints.clear()
+        else:
+            self._hints.pop(key, None)
+
+    def record(self, hit):
+        """
+        Counts one fast-path attempt as a hit or a miss.
+        """
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    @property
+    def hit_rate(self):
+        attempts = self.hits + self.misses
+        return self.hits / attempts if attempts else 0.0
+
+    def stats(self):
+        """
+        Returns the fast-path counters as a dictionary.
+        """
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate, "hints": len(self._hints)}
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
@@ -1,6 +1,12 @@
+import os
+
 import cv2
 import matplotlib.pyplot as plt
 
+from image_processing import ImageProcessing
+from pyramid_viewer import PyramidViewer
+from tiled_image import TiledImage
+
 
 class MicroMacroAlignment:
     def __init__(self, macro_image_path, macro_scale_x, macro_scale_y, micro_scale_x=5.89052520107227, micro_scale_y=5.5226654358700005):
@@ -23,11 +29,20 @@ class MicroMacroAlignment:
         self.macro_image = None
         self.reference_points = []
 
-    def load_macro_image(self):
+    def load_macro_image(self, tiled=True):
         """
         Loads the macro image from the specified path.
+
+        Parameters:
+            tiled (bool): Open the image through a memory-mapped tiled copy (created next to the
+                          image on first use) instead of decoding it into memory.
         """
-        self.macro_image = cv2.imread(self.macro_image_path, cv2.IMREAD_COLOR)
+        if tiled:
+            if not os.path.exists(self.macro_image_path):
+                raise FileNotFoundError(f"Macro image not found at {self.macro_image_path}")
+            self.macro_image = TiledImage.open(self.macro_image_path)
+        else:
+            self.macro_image = cv2.imread(self.macro_image_path, cv2.IMREAD_COLOR)
         if self.macro_image is None:
             raise FileNotFoundError(f"Macro image not found at {self.macro_image_path}")
         print(f"Macro image loaded: {self.macro_image_path}")
@@ -35,38 +50,82 @@ class MicroMacroAlignment:
     def click_reference_points(self):
         """
         Allows the user to click on two reference points in the macro image.
-        Opens the macro image in a separate window.
+        Opens the macro image in a separate zoomable window (scroll wheel to zoom,
+        right click + drag to pan).
         """
         if self.macro_image is None:
             raise ValueError("Macro image not loaded. Call 'load_macro_image' first.")
 
-        def click_event(event, x, y, flags, param):
+        viewer = PyramidViewer(self.macro_image, "Macro Image - Select Two Reference Points")
+        viewer.mark_color = (0, 255, 0)
+
+        def click_event(event, x, y, flags):
             if event == cv2.EVENT_LBUTTONDOWN:
-                # Store the reference point
-                self.reference_points.append((x, y))
-                print(f"Reference point {len(self.reference_points)}: ({x}, {y})")
+                # Store the reference point in full-resolution pixels
+                point = viewer.to_image(x, y)
+                self.reference_points.append(point)
+                print(f"Reference point {len(self.reference_points)}: {point}")
 
                 # Draw a small circle on the clicked point
-                cv2.circle(self.macro_image, (x, y), 5, (0, 255, 0), -1)
-                cv2.imshow("Macro Image - Select Two Reference Points", self.macro_image)
-
-                # Stop after two points
-                if len(self.reference_points) == 2:
-                    print("Two reference points selected.")
-                    cv2.destroyAllWindows()
+                viewer.marks.append(point)
+                viewer.dirty = True
 
         try:
             # Display the macro image in a separate window
-            cv2.namedWindow("Macro Image - Select Two Reference Points", cv2.WINDOW_NORMAL)
-            cv2.imshow("Macro Image - Select Two Reference Points", self.macro_image)
-            cv2.setMouseCallback("Macro Image - Select Two Reference Points", click_event)
-            cv2.waitKey(0)  # Wait until two points are selected
+            viewer.open(click_event)
+            while len(self.reference_points) < 2:  # Wait until two points are selected
+                viewer.show()
+                if cv2.waitKey(1) == 27:  # ESC key to exit without selecting
+                    break
+            if len(self.reference_points) == 2:
+                print("Two reference points selected.")
         except Exception as e:
             print(f"An error occurred: {e}")
         finally:
             # Ensure all OpenCV windows are closed
             cv2.destroyAllWindows()
 
+    def detect_circles(self, radius_range, region=None, max_size=None):
+        """
+        Detects circles in the macro image block by block, so a tiled macro image is read one
+        block at a time instead of being loaded whole.
+
+        Parameters:
+            radius_range (tuple): Min and max radius of circles in microns.
+            region (tuple, optional): (x1, y1, x2, y2) region of the macro image to search, in
+                                      full-resolution pixels. Defaults to the whole image.
+            max_size (int, optional): Detect on a downsampled level whose larger side fits in
+                                      max_size (a tiled image's stored level), for a quick overview
+                                      of circles that stay several pixels wide at that level.
+
+        Returns:
+            tuple: List of detected centers (x, y), and list of circles (x, y, radius), in
+                   full-resolution macro pixels.
+        """
+        if self.macro_image is None:
+            raise ValueError("Macro image not loaded. Call 'load_macro_image' first.")
+
+        if max_size is None:
+            return ImageProcessing.detect_circles_in_blocks(self.macro_image, radius_range,
+                                                            self.macro_scale_x, self.macro_scale_y, region)
+
+        if isinstance(self.macro_image, TiledImage):
+            image, factor = self.macro_image.downsampled(max_size)
+        else:
+            factor = 1
+            while max(self.macro_image.shape[:2]) > max_size * factor:
+                factor *= 2
+            height, width = self.macro_image.shape[0] // factor, self.macro_image.shape[1] // factor
+            image = cv2.resize(self.macro_image, (width, height), interpolation=cv2.INTER_AREA)
+        if region is not None:
+            region = tuple(int(value) // factor for value in region)
+        _, circles = ImageProcessing.detect_circles_in_blocks(image, radius_range, self.macro_scale_x / factor,
+                                                              self.macro_scale_y / factor, region)
+        # Level pixel centers back to full-resolution pixels
+        circles = [(int(x * factor + (factor - 1) / 2), int(y * factor + (factor - 1) / 2), radius * factor)
+                   for x, y, radius in circles]
+        return [(x, y) for x, y, _ in circles], circles
+
     def get_reference_points(self):
         """
         Returns the reference points selected by the user.
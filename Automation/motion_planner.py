@@ -0,0 +1,120 @@
+class MotionPlan:
+    def __init__(self, operations, final_directions):
+        """
+        Ordered UI operations for a sequence of stage moves, with their estimated duration.
+
+        Parameters:
+            operations (list of dict): Operations with the keys 'operation' ('move' or 'backlash'),
+                                       'direction', 'amount' (microns, None for backlash) and 'seconds'.
+            final_directions (dict): Approach direction per axis (+1, -1 or None) after the plan has run.
+        """
+        self.operations = operations
+        self.final_directions = final_directions
+
+    def __iter__(self):
+        return iter(self.operations)
+
+    def __len__(self):
+        return len(self.operations)
+
+    @property
+    def estimated_time(self):
+        return sum(operation["seconds"] for operation in self.operations)
+
+    @property
+    def move_count(self):
+        return sum(operation["operation"] == "move" for operation in self.operations)
+
+    @property
+    def backlash_count(self):
+        return sum(operation["operation"] == "backlash" for operation in self.operations)
+
+    def summary(self):
+        """
+        Returns the plan totals as a dictionary.
+        """
+        return {"moves": self.move_count, "backlash_corrections": self.backlash_count,
+                "estimated_seconds": self.estimated_time}
+
+
+class MotionPlanner:
+    # Direction button -> (axis, sign)
+    AXES = {"right": ("X", 1), "left": ("X", -1), "up": ("Y", 1), "down": ("Y", -1)}
+    DIRECTIONS = {axis_sign: direction for direction, axis_sign in AXES.items()}
+
+    def __init__(self, menu_time=1.0, backlash_time=10.0, type_interval=0.1):
+        """
+        Plans relative stage moves for Automation.move.
+
+        The planner remembers the direction each axis was last approached from. A backlash
+        correction is only scheduled when an axis reverses (or its direction is not known
+        yet), and consecutive moves in the same direction are combined into one command.
+
+        Parameters:
+            menu_time (float): Seconds spent opening the context menus before each move.
+            backlash_time (float): Seconds taken by one backlash correction.
+            type_interval (float): Seconds per typed character of the amount.
+        """
+        self.menu_time = menu_time
+        self.backlash_time = backlash_time
+        self.type_interval = type_interval
+        self.last_direction = {"X": None, "Y": None}
+
+    def plan(self, moves, t=2, tt=4, merge=True, backlash="auto"):
+        """
+        Plans a sequence of moves from the current approach directions, without running it.
+
+        Parameters:
+            moves (list of tuple): Moves as (amount in microns, direction).
+            t (float): Delay after each step of the move dialog, as in Automation.move.
+            tt (float): Delay after clicking the direction button, as in Automation.move.
+            merge (bool): Combine consecutive moves in the same direction into one move. Reversals
+                          are kept, with their backlash correction.
+            backlash (str): 'auto' corrects backlash only on reversals, 'always' after every move, 'never' not at all.
+
+        Returns:
+            MotionPlan: The planned operations.
+        """
+        if backlash not in ("auto", "always", "never"):
+            raise ValueError(f"Unknown backlash mode: {backlash}")
+
+        steps = []  # [axis, signed amount]
+        for amount, direction in moves:
+            if direction not in self.AXES:
+                raise ValueError(f"Invalid direction '{direction}'. Please use 'right', 'left', 'up', or 'down'.")
+            if amount == 0:
+                continue
+            axis, sign = self.AXES[direction]
+            if merge and steps and steps[-1][0] == axis and (steps[-1][1] > 0) == (sign > 0):
+                steps[-1][1] += sign * amount
+            else:
+                steps.append([axis, sign * amount])
+
+        directions = dict(self.last_direction)
+        operations = []
+        for axis, signed_amount in steps:
+            amount = round(abs(signed_amount), 6)
+            sign = 1 if signed_amount > 0 else -1
+            direction = self.DIRECTIONS[(axis, sign)]
+            operations.append({"operation": "move", "direction": direction, "amount": amount,
+                               "seconds": self.menu_time + 3 * t + self.type_interval * len(str(amount)) + tt})
+
+            reverses = directions[axis] != sign
+            if backlash == "always" or (backlash == "auto" and reverses):
+                operations.append({"operation": "backlash", "direction": direction, "amount": None,
+                                   "seconds": self.backlash_time})
+            directions[axis] = sign
+
+        return MotionPlan(operations, directions)
+
+    def record(self, plan):
+        """
+        Updates the approach directions after a plan has been run.
+        """
+        self.last_direction.update(plan.final_directions)
+
+    def reset(self):
+        """
+        Forgets the approach directions, e.g. after the stage was moved by hand.
+        """
+        self.last_direction = {"X": None, "Y": None}
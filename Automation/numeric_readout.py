@@ -0,0 +1,210 @@
+import re
+
+import cv2
+import numpy as np
+import pytesseract
+
+
+class NumericReadout:
+    # Normalized label text -> field name, as parsed by Automation.extract_coordinates
+    FIELD_LABELS = {"extension": "extension", "xaxisposition": "x", "yaxisposition": "y"}
+    GLYPH_SIZE = (12, 20)  # (width, height) of normalized digit glyphs
+
+    def __init__(self, min_score=0.85, min_margin=0.05, ink_threshold=80, band_padding=2):
+        """
+        Fast reader for the X/Y/Extension readout of the iMicro UI.
+
+        The value fields are located once with Tesseract, which also provides the text used
+        to learn a glyph template for every digit of the instrument's font. Later reads
+        segment each value field into glyphs and match them against those templates, which
+        takes milliseconds. Reads that cannot be matched confidently return None so the
+        caller can fall back to Tesseract, and so do all reads until every digit 0-9 has been
+        learned: an unseen digit would otherwise match a similar learned one (8/6/9/0, 3/5).
+
+        Parameters:
+            min_score (float): Minimum normalized correlation for a digit to be accepted.
+            min_margin (float): Minimum lead of the best matching digit over the runner-up.
+            ink_threshold (int): Minimum darkness (0-255) of a text pixel.
+            band_padding (int): Pixels added above and below each located value line.
+        """
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self.ink_threshold = ink_threshold
+        self.band_padding = band_padding
+        self.fields = {}  # field name -> (y1, y2) value band in readout-region pixels
+        self.region_shape = None
+        self.glyphs = {}  # digit -> normalized template vector
+        self.fast_reads = 0
+        self.fallback_reads = 0
+
+    def read(self, image):
+        """
+        Reads the values from a capture of the readout region using the learned glyphs.
+
+        Parameters:
+            image (numpy.ndarray): RGB capture of the readout region.
+
+        Returns:
+            tuple: (x_value, y_value, extension_value), with None for fields the readout does not show,
+                   or None if the fields are not located yet, not all digits are learned yet or any
+                   glyph could not be matched.
+        """
+        if not self.fields or image.shape[:2] != self.region_shape or len(self.glyphs) < 10:
+            return None
+
+        values = {}
+        for name, (y1, y2) in self.fields.items():
+            text = self._read_band(image[y1:y2])
+            try:
+                values[name] = float(text)
+            except (TypeError, ValueError):
+                return None
+
+        self.fast_reads += 1
+        return values.get("x"), values.get("y"), values.get("extension")
+
+    def calibrate(self, image):
+        """
+        Runs Tesseract once on the readout region, locates the value fields and learns the
+        glyphs of their digits.
+
+        Parameters:
+            image (numpy.ndarray): RGB capture of the readout region.
+
+        Returns:
+            str: The OCR text, one line per text line, as image_to_string would return it.
+        """
+        self.fallback_reads += 1
+        data = pytesseract.image_to_data(image, lang='eng', output_type=pytesseract.Output.DICT)
+
+        # Group words into text lines, keeping the reading order
+        lines = {}
+        for i, word in enumerate(data["text"]):
+            if not word.strip():
+                continue
+            key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            top, bottom = data["top"][i], data["top"][i] + data["height"][i]
+            if key not in lines:
+                lines[key] = [[], top, bottom]
+            lines[key][0].append(word)
+            lines[key][1] = min(lines[key][1], top)
+            lines[key][2] = max(lines[key][2], bottom)
+        lines = [(" ".join(words), top, bottom) for words, top, bottom in lines.values()]
+
+        fields = {}
+        for i, (text, top, bottom) in enumerate(lines):
+            name = self.FIELD_LABELS.get(re.sub(r"\s+", "", text.lower()))
+            if name is None:
+                continue
+            # The value is the first numeric line below the label
+            for value_text, value_top, value_bottom in lines[i + 1:]:
+                if value_top >= bottom and re.search(r"\d", value_text):
+                    y1 = max(0, value_top - self.band_padding)
+                    y2 = min(image.shape[0], value_bottom + self.band_padding)
+                    fields[name] = (y1, y2)
+                    self.learn(image[y1:y2], value_text.split()[0])
+                    break
+
+        self.fields = fields
+        self.region_shape = image.shape[:2]
+        return "\n".join(text for text, _, _ in lines)
+
+    def learn(self, band, text):
+        """
+        Learns digit glyphs from a value band whose text is known.
+
+        Parameters:
+            band (numpy.ndarray): RGB image of one value line.
+            text (str): The value shown in the band (e.g. '10.3192').
+
+        Returns:
+            bool: False if the band could not be segmented into one glyph per character.
+        """
+        chars = [char for char in text if char in "0123456789.-"]
+        glyphs = self._segment(band)
+        if glyphs is None or len(glyphs[1]) != len(chars):
+            return False
+
+        ink, boxes, text_height = glyphs
+        for char, box in zip(chars, boxes):
+            if char.isdigit():
+                vector = self._glyph_vector(ink, box, text_height)
+                if char in self.glyphs:
+                    vector = self._normalize(self.glyphs[char] + vector)
+                self.glyphs[char] = vector
+        return True
+
+    def _read_band(self, band):
+        glyphs = self._segment(band)
+        if glyphs is None:
+            return None
+
+        ink, boxes, text_height = glyphs
+        text_bottom = max(box[3] for box in boxes)
+
+        chars = []
+        for box in boxes:
+            x1, x2, y1, y2 = box
+            if y2 - y1 < 0.4 * text_height:
+                # Small glyphs: a decimal point sits on the baseline, a minus sign in the middle
+                chars.append("." if y2 >= text_bottom - 0.15 * text_height else "-")
+                continue
+
+            vector = self._glyph_vector(ink, box, text_height)
+            best_char, best_score, second_score = None, -1.0, -1.0
+            for char, template in self.glyphs.items():
+                score = float(np.dot(vector, template))
+                if score > best_score:
+                    best_char, best_score, second_score = char, score, best_score
+                elif score > second_score:
+                    second_score = score
+            if best_score < self.min_score or best_score - second_score < self.min_margin:
+                return None
+            chars.append(best_char)
+        return "".join(chars)
+
+    def _segment(self, band):
+        """
+        Splits a value band into glyphs using the column projection of its dark, unsaturated pixels.
+
+        Returns:
+            tuple: (ink image, list of (x1, x2, y1, y2) glyph boxes, text height), or None if no text.
+        """
+        if band.ndim == 3:
+            gray = cv2.cvtColor(band, cv2.COLOR_RGB2GRAY)
+            saturation = band.max(axis=2).astype(np.int16) - band.min(axis=2)
+            ink = np.where(saturation < 60, 255 - gray, 0).astype(np.uint8)  # Ignore the colored box borders
+        else:
+            ink = 255 - band
+        mask = ink >= self.ink_threshold
+
+        columns = np.flatnonzero(mask.any(axis=0))
+        if columns.size == 0:
+            return None
+        # Start a new glyph wherever there is an empty column between ink columns
+        splits = np.flatnonzero(np.diff(columns) > 1) + 1
+        boxes = []
+        for run in np.split(columns, splits):
+            x1, x2 = run[0], run[-1] + 1
+            rows = np.flatnonzero(mask[:, x1:x2].any(axis=1))
+            boxes.append((x1, x2, rows[0], rows[-1] + 1))
+
+        text_height = max(y2 - y1 for _, _, y1, y2 in boxes)
+        return ink, boxes, text_height
+
+    def _glyph_vector(self, ink, box, text_height):
+        x1, x2, y1, y2 = box
+        glyph = ink[y1:y2, x1:x2]
+        # Pad narrow glyphs (e.g. '1') to a common aspect ratio instead of stretching them
+        canvas_width = max(x2 - x1, int(round(0.6 * text_height)))
+        canvas = np.zeros((y2 - y1, canvas_width), dtype=np.uint8)
+        offset = (canvas_width - (x2 - x1)) // 2
+        canvas[:, offset:offset + x2 - x1] = glyph
+        resized = cv2.resize(canvas, self.GLYPH_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+        return self._normalize(resized.ravel())
+
+    @staticmethod
+    def _normalize(vector):
+        vector = vector - vector.mean()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
@@ -0,0 +1,206 @@
+import cv2
+import numpy as np
+
+
+class PyramidViewer:
+    # Button-up event that ends panning for each button-down event that can start it
+    _RELEASE_EVENTS = {
+        cv2.EVENT_LBUTTONDOWN: cv2.EVENT_LBUTTONUP,
+        cv2.EVENT_RBUTTONDOWN: cv2.EVENT_RBUTTONUP,
+        cv2.EVENT_MBUTTONDOWN: cv2.EVENT_MBUTTONUP,
+    }
+
+    def __init__(self, image, window_name, view_size=(1600, 900), pan_event=cv2.EVENT_RBUTTONDOWN,
+                 min_level_size=512, max_zoom=10.0, transform=None, image_size=None):
+        """
+        Zoomable and pannable OpenCV window for large images.
+
+        A multi-resolution pyramid of the image is built once (or read on demand from a
+        TiledImage). Every redraw crops only the visible part of the level closest to the
+        current zoom and resamples it to the window, so the cost of a redraw depends on the
+        window size, not on the image size.
+        Window pixels map to full-resolution image pixels as image = (window + pan) / zoom.
+
+        An optional 2x3 affine transform (e.g. a rotation) is applied on the fly while
+        rendering, so a transformed copy of the image is never materialized. Image pixels
+        are then pixels of the transformed image; to_source maps them back.
+
+        Parameters:
+            image (numpy.ndarray or TiledImage): Full-resolution image.
+            window_name (str): Title of the OpenCV window.
+            view_size (tuple): Maximum (width, height) of the rendered viewport.
+            pan_event (int): Mouse button-down event that starts panning by dragging.
+            min_level_size (int): No pyramid level is built with a larger side below this size.
+            max_zoom (float): Maximum magnification.
+            transform (numpy.ndarray, optional): 2x3 affine matrix from source pixels to displayed image pixels.
+            image_size (tuple, optional): (width, height) of the transformed image. Defaults to the source size.
+        """
+        self.window_name = window_name
+        if isinstance(image, np.ndarray):
+            # Level n averages 2 ** n x 2 ** n source pixels, like the levels of a TiledImage
+            self.levels = [image]
+            while max(self.levels[-1].shape[:2]) >= 2 * min_level_size:
+                level = self.levels[-1]
+                height, width = level.shape[0] // 2, level.shape[1] // 2
+                self.levels.append(cv2.resize(level[:2 * height, :2 * width], (width, height),
+                                              interpolation=cv2.INTER_AREA))
+        else:
+            self.levels = image.levels  # Regions are read from disk on demand
+
+        self.transform = np.float64(transform) if transform is not None else np.eye(2, 3)
+        self.inverse_transform = cv2.invertAffineTransform(self.transform)
+        if image_size is None:
+            image_size = (image.shape[1], image.shape[0])
+        width, height = image_size
+        self.image_size = (width, height)
+        self.view_size = (min(width, view_size[0]), min(height, view_size[1]))
+
+        # Start with the whole image in view
+        fit_zoom = min(self.view_size[0] / width, self.view_size[1] / height)
+        self.min_zoom = min(0.1, fit_zoom)
+        self.max_zoom = max_zoom
+        self.zoom_scale = fit_zoom
+        self.pan_x, self.pan_y = 0.0, 0.0
+
+        self.pan_event = pan_event
+        self.dragging = False
+        self.drag_start_x, self.drag_start_y = 0, 0
+
+        self.marks = []  # Image points drawn on top of the view
+        self.mark_color = (255, 0, 0)
+        self.dirty = True
+
+    def to_image(self, x, y):
+        """
+        Maps a window pixel to the nearest full-resolution image pixel.
+
+        Returns:
+            tuple: (x, y) in image pixels.
+        """
+        return (int(round((x + self.pan_x) / self.zoom_scale)),
+                int(round((y + self.pan_y) / self.zoom_scale)))
+
+    def to_window(self, x, y):
+        """
+        Maps a full-resolution image pixel to the window.
+
+        Returns:
+            tuple: (x, y) in window pixels.
+        """
+        return (int(round(x * self.zoom_scale - self.pan_x)),
+                int(round(y * self.zoom_scale - self.pan_y)))
+
+    def to_source(self, x, y):
+        """
+        Maps a displayed image pixel back through the inverse transform to the source image.
+
+        Returns:
+            tuple: (x, y) in source image pixels (floats).
+        """
+        source = self.inverse_transform @ np.array([x, y, 1.0])
+        return float(source[0]), float(source[1])
+
+    def zoom(self, factor, x=0, y=0):
+        """
+        Multiplies the zoom by factor, keeping the image pixel under window pixel (x, y) in place.
+        """
+        image_x = (x + self.pan_x) / self.zoom_scale
+        image_y = (y + self.pan_y) / self.zoom_scale
+        self.zoom_scale = max(self.min_zoom, min(self.zoom_scale * factor, self.max_zoom))
+        self.pan_x = image_x * self.zoom_scale - x
+        self.pan_y = image_y * self.zoom_scale - y
+        self.dirty = True
+
+    def handle_event(self, event, x, y, flags):
+        """
+        Applies panning and zooming mouse events.
+
+        Returns:
+            bool: True if the event was consumed by panning or zooming.
+        """
+        if event == self.pan_event:
+            self.dragging = True
+            self.drag_start_x, self.drag_start_y = x, y
+            return True
+
+        if event == cv2.EVENT_MOUSEMOVE and self.dragging:
+            self.pan_x -= x - self.drag_start_x
+            self.pan_y -= y - self.drag_start_y
+            self.drag_start_x, self.drag_start_y = x, y
+            self.dirty = True
+            return True
+
+        if event == self._RELEASE_EVENTS[self.pan_event]:
+            self.dragging = False
+            return True
+
+        if event == cv2.EVENT_MOUSEWHEEL:
+            self.zoom(1.1 if flags > 0 else 1 / 1.1, x, y)
+            return True
+
+        return False
+
+    def render(self):
+        """
+        Renders the current viewport from the best pyramid level.
+
+        Returns:
+            numpy.ndarray: Image of view_size.
+        """
+        # Coarsest level that still has at least one pixel per window pixel
+        level_index = 0
+        while level_index + 1 < len(self.levels) and 2 ** (level_index + 1) * self.zoom_scale <= 1:
+            level_index += 1
+        level = self.levels[level_index]
+        factor = 2 ** level_index  # Source pixels per level pixel
+        center = (factor - 1) / 2  # Source pixel at the center of level pixel 0
+
+        # Window pixels from level pixels: window = zoom * transform(factor * level + center) - pan
+        matrix = self.transform.copy()
+        matrix[:, 2] = (matrix[:, 2] + matrix[:, :2] @ (center, center)) * self.zoom_scale - (self.pan_x, self.pan_y)
+        matrix[:, :2] *= factor * self.zoom_scale
+
+        # Visible part of the level (bounding box of the window corners), with a margin for the interpolation kernel
+        view_width, view_height = self.view_size
+        corners = np.array([[0, 0, 1], [view_width, 0, 1], [0, view_height, 1], [view_width, view_height, 1]], float)
+        visible = corners @ cv2.invertAffineTransform(matrix).T
+        x1 = max(0, int(np.floor(visible[:, 0].min())) - 2)
+        y1 = max(0, int(np.floor(visible[:, 1].min())) - 2)
+        x2 = min(level.shape[1], int(np.ceil(visible[:, 0].max())) + 2)
+        y2 = min(level.shape[0], int(np.ceil(visible[:, 1].max())) + 2)
+
+        if x1 >= x2 or y1 >= y2:
+            view = np.zeros((view_height, view_width) + level.shape[2:], dtype=level.dtype)
+        else:
+            matrix[:, 2] += matrix[:, :2] @ (x1, y1)  # The crop starts at (x1, y1)
+            view = cv2.warpAffine(np.ascontiguousarray(level[y1:y2, x1:x2]), matrix, (view_width, view_height),
+                                  flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT)
+
+        for mark in self.marks:
+            cv2.circle(view, self.to_window(*mark), 5, self.mark_color, -1)
+        return view
+
+    def open(self, on_click=None):
+        """
+        Opens the window. Mouse events that are not used for panning or zooming are passed to
+        on_click(event, x, y, flags) with window coordinates; use to_image to convert them.
+        """
+        def callback(event, x, y, flags, param):
+            if not self.handle_event(event, x, y, flags) and on_click is not None:
+                on_click(event, x, y, flags)
+
+        cv2.namedWindow(self.window_name, cv2.WINDOW_NORMAL)
+        cv2.setMouseCallback(self.window_name, callback)
+        self.dirty = True
+        self.show()
+
+    def show(self):
+        """
+        Redraws the window if the view changed since the last call.
+        """
+        if self.dirty:
+            self.dirty = False
+            cv2.imshow(self.window_name, self.render())
+
+    def close(self):
+        cv2.destroyWindow(self.window_name)
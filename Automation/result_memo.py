@@ -0,0 +1,67 @@
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+
+class ResultMemo:
+    def __init__(self, max_entries=256):
+        """
+        Least-recently-used memo of results computed from screen pixels, keyed by a
+        content hash of the pixels plus whatever else the result depends on
+        (template, threshold, OCR configuration, ...).
+
+        Parameters:
+            max_entries (int): Number of results kept before the least recently used is evicted.
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def digest(pixels):
+        """
+        Fast content hash of an image: CRC-32 and Adler-32 of its bytes, combined with its shape.
+        """
+        data = np.ascontiguousarray(pixels)
+        view = memoryview(data).cast("B")
+        return data.shape, str(data.dtype), zlib.crc32(view), zlib.adler32(view)
+
+    def get(self, key):
+        """
+        Looks up a memoized result.
+
+        Returns:
+            tuple: (found, result).
+        """
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, self._entries[key]
+        self.misses += 1
+        return False, None
+
+    def put(self, key, result):
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        """
+        Returns the memo counters as a dictionary.
+        """
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate, "entries": len(self._entries)}
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
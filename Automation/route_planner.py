@@ -0,0 +1,158 @@
+import time
+
+import numpy as np
+
+
+class RoutePlanner:
+    def __init__(self, reversal_cost=50.0, time_limit=0.3):
+        """
+        Orders stage targets to minimize travel and axis reversals.
+
+        X and Y are moved separately, so travel is measured as the L1 distance. Every time an
+        axis moves against its previous direction a backlash correction is needed, which is
+        charged as reversal_cost microns of travel. Routes are built by nearest neighbour and
+        improved with 2-opt until no improving move is left or the time limit is reached.
+
+        Parameters:
+            reversal_cost (float): Travel in microns that one axis reversal is worth.
+            time_limit (float): Maximum time in seconds spent improving a route with 2-opt.
+        """
+        self.reversal_cost = reversal_cost
+        self.time_limit = time_limit
+
+    def plan(self, points, start=None):
+        """
+        Plans the visiting order of the targets.
+
+        Parameters:
+            points (array-like): Stage targets (X, Y) in microns, shape (N, 2).
+            start (tuple, optional): Current stage position. If omitted, the route starts at the first target.
+
+        Returns:
+            tuple: (order as an index array into points, summary dictionary comparing the planned
+                   route with the given order).
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        if len(points) < 3 and start is None:
+            order = np.arange(len(points))
+        else:
+            order = self._nearest_neighbour(points, start)
+            order = self._two_opt(points, order, start)
+
+        naive = self.evaluate(points, start)
+        planned = self.evaluate(points[order], start)
+        summary = {
+            "naive_length": naive["length"], "naive_reversals": naive["reversals"],
+            "planned_length": planned["length"], "planned_reversals": planned["reversals"],
+        }
+        return order, summary
+
+    @staticmethod
+    def evaluate(points, start=None):
+        """
+        Measures a route visited in the given order.
+
+        Returns:
+            dict: L1 travel in microns ('length') and number of axis reversals ('reversals').
+        """
+        path = np.asarray(points, dtype=float).reshape(-1, 2)
+        if start is not None:
+            path = np.vstack((np.asarray(start, dtype=float).reshape(1, 2), path))
+        moves = np.diff(path, axis=0)
+
+        reversals = 0
+        for axis in range(2):
+            # An axis keeps its approach direction through moves that do not use it
+            directions = np.sign(moves[:, axis])
+            directions = directions[directions != 0]
+            reversals += int(np.count_nonzero(directions[1:] != directions[:-1]))
+        return {"length": float(np.abs(moves).sum()), "reversals": reversals}
+
+    def _nearest_neighbour(self, points, start):
+        # Unvisited targets are kept in the first `count` entries; a visited one is swapped to the end
+        candidates = np.arange(len(points))
+        coordinates = points.copy()
+        count = len(points)
+        order = []
+        last_direction = np.zeros(2)
+        if start is None:
+            position = points[0]
+            candidates[[0, count - 1]] = candidates[[count - 1, 0]]
+            coordinates[[0, count - 1]] = coordinates[[count - 1, 0]]
+            count -= 1
+            order.append(0)
+        else:
+            position = np.asarray(start, dtype=float)
+
+        while count:
+            moves = coordinates[:count] - position
+            costs = np.abs(moves).sum(axis=1)
+            if last_direction.any():
+                costs += self.reversal_cost * (moves * last_direction < 0).sum(axis=1)
+            best = int(np.argmin(costs))
+
+            move_direction = np.sign(moves[best])
+            last_direction = np.where(move_direction != 0, move_direction, last_direction)
+            position = coordinates[best].copy()
+            order.append(candidates[best])
+
+            count -= 1
+            candidates[best], candidates[count] = candidates[count], candidates[best]
+            coordinates[[best, count]] = coordinates[[count, best]]
+        return np.array(order, dtype=np.intp)
+
+    def _two_opt(self, points, order, start):
+        # Path nodes; the first node (start position or first target) stays fixed
+        fixed_start = start is not None
+        if fixed_start:
+            path = np.vstack((np.asarray(start, dtype=float).reshape(1, 2), points[order]))
+        else:
+            path = points[order]
+        nodes = np.concatenate(([-1], order)) if fixed_start else order.copy()
+        last = len(path) - 1
+        deadline = time.perf_counter() + self.time_limit
+
+        improved = True
+        while improved and time.perf_counter() < deadline:
+            improved = False
+            for i in range(last - 1):
+                if time.perf_counter() >= deadline:
+                    break
+                j = np.arange(i + 2, last + 1)
+                delta = self._reversal_delta(path, i, j)
+                best = int(np.argmin(delta))
+                if delta[best] < -1e-9:
+                    j = j[best]
+                    path[i + 1:j + 1] = path[i + 1:j + 1][::-1].copy()
+                    nodes[i + 1:j + 1] = nodes[i + 1:j + 1][::-1].copy()
+                    improved = True
+
+        return nodes[1:] if fixed_start else nodes
+
+    def _reversal_delta(self, path, i, j):
+        """
+        Cost change of reversing path[i + 1:j + 1] for every j, counting the L1 length and the
+        axis reversals between consecutive moves at both ends of the reversed segment.
+        """
+        moves = np.diff(path, axis=0)
+        padded = np.vstack((np.zeros((1, 2)), moves, np.zeros((2, 2))))  # padded[k + 1] = moves[k]
+
+        def move(k):
+            return padded[np.asarray(k) + 1]
+
+        def reversals(u, v):
+            return (u * v < 0).sum(axis=-1)
+
+        has_next = j < len(path) - 1
+        after = np.where(has_next, j + 1, j)  # Without a next node the second new edge does not exist
+        new_first = path[j] - path[i]
+        new_second = np.where(has_next[:, None], path[after] - path[i + 1], 0.0)
+
+        length = (np.abs(new_first).sum(axis=1) + np.abs(new_second).sum(axis=1)
+                  - np.abs(moves[i]).sum() - np.abs(move(j) * has_next[:, None]).sum(axis=1))
+
+        old_reversals = (reversals(move(i - 1), move(i)) + reversals(move(i), move(i + 1))
+                         + reversals(move(j - 1), move(j)) + reversals(move(j), move(j + 1)))
+        new_reversals = (reversals(move(i - 1), new_first) + reversals(new_first, -move(j - 1))
+                         + reversals(-move(i + 1), new_second) + reversals(new_second, move(j + 1)))
+        return length + self.reversal_cost * (new_reversals - old_reversals)
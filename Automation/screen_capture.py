@@ -0,0 +1,48 @@
+import threading
+
+import mss
+import numpy as np
+
+from frame_source import FrameSource
+
+
+class ScreenCapture(FrameSource):
+    def __init__(self, pool_size=3, max_pooled_shapes=8):
+        """
+        Live frame source: a long-lived screen capture session that reuses one mss handle
+        per thread and hands out NumPy frames without intermediate PIL copies.
+
+        Parameters:
+            pool_size (int): Number of preallocated buffers per frame shape.
+            max_pooled_shapes (int): Number of distinct frame shapes that keep a buffer pool.
+        """
+        super().__init__(pool_size=pool_size, max_pooled_shapes=max_pooled_shapes)
+        self._local = threading.local()  # mss handles must stay on the thread that opened them
+
+    def _sct(self):
+        sct = getattr(self._local, "sct", None)
+        if sct is None:
+            sct = mss.mss()
+            self._local.sct = sct
+        return sct
+
+    def monitor(self, monitor_index):
+        """
+        Returns the mss geometry dictionary (left, top, width, height) of a monitor.
+        """
+        return self._sct().monitors[monitor_index]
+
+    def _grab_bgra(self, region):
+        # Zero-copy view over the raw BGRA buffer returned by mss
+        shot = self._sct().grab(region)
+        return np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+
+    def close(self):
+        """
+        Closes the mss handle of the calling thread and drops the buffer pools.
+        """
+        sct = getattr(self._local, "sct", None)
+        if sct is not None:
+            sct.close()
+            self._local.sct = None
+        super().close()
@@ -1,66 +1,359 @@
+import os
+import time
 import cv2
-import numpy as np
-import mss
 from PIL import Image
+from template_registry import TemplateRegistry
+from location_hints import LocationHintCache
+from screen_capture import ScreenCapture
+from result_memo import ResultMemo
 
 class ScreenUtils:
+    # Grayscale templates decoded once and shared by every lookup
+    templates = TemplateRegistry()
+    # Where frames come from: the live mss session by default, or a replay of recorded frames
+    frame_source = ScreenCapture(pool_size=3)
+    # Last known location of each template, searched before the full screen
+    location_hints = LocationHintCache(padding=40)
+    # Full-screen match results keyed by a content hash of the frame; unchanged screens are not re-matched
+    match_memo = ResultMemo(max_entries=256)
+    # Matching mode per template name; large windows are found coarse-to-fine
+    default_match_mode = "full"
+    template_match_modes = {
+        "relative move": "pyramid2",
+        "Extension control": "pyramid2",
+        "displacement window": "pyramid2",
+    }
+    pyramid_candidates = 3  # Coarse peaks refined at full resolution
+    pyramid_min_template_size = 8  # Smallest template side (in downsampled pixels) worth matching coarsely
+
     @staticmethod
-    def find_image_center_on_screen(image_path, monitor_index=2, threshold=0.8):
+    def find_image_center_on_screen(image_path, monitor_index=2, threshold=0.8, match_mode=None):
         """
         Finds the center coordinates of a target image on a specified screen monitor.
         """
-        target_img = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
-        if target_img is None:
-            raise ValueError(f"Could not load image at {image_path}")
+        match = ScreenUtils._locate_on_screen(image_path, monitor_index, threshold, match_mode)
+        return ScreenUtils.center_of(match)
+
+    @staticmethod
+    def find_image_edges_on_screen(image_path, monitor_index=2, threshold=0.8, match_mode=None):
+        """
+        Finds the edges of a target image on a specified screen monitor.
+        """
+        match = ScreenUtils._locate_on_screen(image_path, monitor_index, threshold, match_mode)
+        if match is None:
+            return None
+
+        top_left_x, top_left_y, target_width, target_height = match
+        bottom_right_x = top_left_x + target_width
+        bottom_right_y = top_left_y + target_height
+        return top_left_x, top_left_y, bottom_right_x, bottom_right_y
+
+    @staticmethod
+    def locate_images_on_screen(image_paths, monitor_index=2, threshold=0.8, match_mode=None):
+        """
+        Matches several target images against a single screenshot of the monitor.
+        Each distinct template is matched once, however often it appears in image_paths.
+
+        Parameters:
+            image_paths (list of str): Paths of the target images.
+            monitor_index (int): Monitor to capture.
+            threshold (float): Minimum match score.
+            match_mode (str, optional): 'full', 'pyramid2' or 'pyramid4'. Defaults to the per-template mode.
+
+        Returns:
+            dict: Image path mapped to (top_left_x, top_left_y, width, height) in screen
+                  coordinates, or None when the image was not found.
+        """
+        screen_gray, origin = ScreenUtils._grab_screen_gray(monitor_index)
+        frame_key = ScreenUtils.match_memo.digest(screen_gray)  # Hashed once for the whole batch
 
-        target_height, target_width = target_img.shape[:2]
+        matches = {}
+        for image_path in image_paths:
+            if image_path not in matches:
+                matches[image_path] = ScreenUtils._match_template(screen_gray, image_path, threshold,
+                                                                  match_mode=match_mode, origin=origin,
+                                                                  frame_key=frame_key)
+        return matches
 
-        with mss.mss() as sct:
-            # Single screenshot capture
-            screenshot = sct.grab(sct.monitors[monitor_index])
-            screen_img = np.array(screenshot)
+    @staticmethod
+    def _locate_on_screen(image_path, monitor_index=2, threshold=0.8, match_mode=None):
+        """
+        Matches a cached template against the monitor.
 
-            screen_gray = cv2.cvtColor(screen_img, cv2.COLOR_BGRA2GRAY)
-            target_gray = cv2.cvtColor(target_img, cv2.COLOR_BGR2GRAY)
+        Returns:
+            tuple: (top_left_x, top_left_y, width, height) in screen coordinates, or None.
+        """
+        screen_gray, origin = ScreenUtils._grab_screen_gray(monitor_index)
+        return ScreenUtils._match_template(screen_gray, image_path, threshold, match_mode=match_mode, origin=origin)
 
-            result = cv2.matchTemplate(screen_gray, target_gray, cv2.TM_CCOEFF_NORMED)
-            _, max_val, _, max_loc = cv2.minMaxLoc(result)
+    @staticmethod
+    def _grab_screen_gray(monitor_index=2):
+        """
+        Captures the whole monitor once and converts it to grayscale.
 
+        Returns:
+            tuple: (screen_gray, (left, top)) where (left, top) is the monitor's screen position.
+        """
+        monitor = ScreenUtils.frame_source.monitor(monitor_index)
+        screen_gray = ScreenUtils.frame_source.grab(monitor, mode="gray")
+        return screen_gray, (monitor["left"], monitor["top"])
+
+    @staticmethod
+    def _match_template(screen_gray, image_path, threshold=0.8, use_hint=True, match_mode=None, origin=(0, 0),
+                        frame_key=None):
+        """
+        Matches a cached template against an already captured grayscale screen.
+        The padded region around the template's last hit is searched first. Otherwise the
+        result is looked up in the match memo by the content hash of the frame, and only
+        on a memo miss is the screen searched (coarse-to-fine for pyramid modes, then at
+        full resolution).
+
+        Parameters:
+            origin (tuple): Screen position (left, top) of the captured monitor.
+            frame_key (tuple, optional): ResultMemo.digest of screen_gray, if already computed.
+
+        Returns:
+            tuple: (top_left_x, top_left_y, width, height) in screen coordinates, or None.
+        """
+        target_gray = ScreenUtils.templates.get(image_path)
+        target_height, target_width = target_gray.shape[:2]
+        hints = ScreenUtils.location_hints
+
+        region = hints.search_region(image_path, screen_gray.shape) if use_hint else None
+        if region is not None:
+            x1, y1, x2, y2 = region
+            max_val, max_loc = ScreenUtils._best_match(screen_gray[y1:y2, x1:x2], target_gray)
+            hints.record(max_val >= threshold)
             if max_val >= threshold:
-                top_left = max_loc
-                center_x = 1920 + top_left[0] + target_width // 2
-                center_y = top_left[1] + target_height // 2
-                return center_x, center_y
+                top_left_x, top_left_y = x1 + max_loc[0], y1 + max_loc[1]
+                hints.update(image_path, top_left_x, top_left_y, target_width, target_height)
+                return origin[0] + top_left_x, origin[1] + top_left_y, target_width, target_height
+
+        match_mode = ScreenUtils.get_match_mode(image_path, match_mode)
+        if frame_key is None:
+            frame_key = ScreenUtils.match_memo.digest(screen_gray)
+        memo_key = (frame_key, image_path, ScreenUtils.match_memo.digest(target_gray), threshold, match_mode)
+        found, top_left = ScreenUtils.match_memo.get(memo_key)
+
+        if not found:
+            top_left = None
+            factor = ScreenUtils._pyramid_factor(match_mode)
+            if factor > 1:
+                top_left = ScreenUtils._match_pyramid(screen_gray, target_gray, factor, threshold)
+
+            if top_left is None:
+                max_val, max_loc = ScreenUtils._best_match(screen_gray, target_gray)
+                top_left = max_loc if max_val >= threshold else None
+            ScreenUtils.match_memo.put(memo_key, top_left)
+
+        if top_left is None:
             return None
 
+        hints.update(image_path, top_left[0], top_left[1], target_width, target_height)
+        return origin[0] + top_left[0], origin[1] + top_left[1], target_width, target_height
+
     @staticmethod
-    def find_image_edges_on_screen(image_path, monitor_index=2, threshold=0.8):
+    def _best_match(screen_gray, target_gray):
         """
-        Finds the edges of a target image on a specified screen monitor.
+        Runs normalized cross-correlation and returns (max_val, max_loc).
         """
-        target_img = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
-        if target_img is None:
-            raise ValueError(f"Could not load image at {image_path}")
+        result = cv2.matchTemplate(screen_gray, target_gray, cv2.TM_CCOEFF_NORMED)
+        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+        return max_val, max_loc
 
-        target_height, target_width = target_img.shape[:2]
+    @staticmethod
+    def _match_pyramid(screen_gray, target_gray, factor, threshold=0.8):
+        """
+        Finds a candidate on a downsampled screen and template, then refines it at full
+        resolution in a small window around the candidate. The full-resolution score is
+        compared against the threshold, so the result is the same pixel-exact location.
 
-        with mss.mss() as sct:
-            screenshot = sct.grab(sct.monitors[monitor_index])
-            screen_img = np.array(screenshot)
+        Returns:
+            tuple: (top_left_x, top_left_y) in monitor pixels, or None if refinement failed.
+        """
+        target_height, target_width = target_gray.shape[:2]
+        if min(target_height, target_width) // factor < ScreenUtils.pyramid_min_template_size:
+            return None
 
-            screen_gray = cv2.cvtColor(screen_img, cv2.COLOR_BGRA2GRAY)
-            target_gray = cv2.cvtColor(target_img, cv2.COLOR_BGR2GRAY)
+        screen_height, screen_width = screen_gray.shape[:2]
+        small_screen = cv2.resize(screen_gray, (screen_width // factor, screen_height // factor),
+                                  interpolation=cv2.INTER_AREA)
+        small_target = cv2.resize(target_gray, (target_width // factor, target_height // factor),
+                                  interpolation=cv2.INTER_AREA)
+        coarse = cv2.matchTemplate(small_screen, small_target, cv2.TM_CCOEFF_NORMED)
+
+        # Refine the strongest coarse peaks; similar-looking windows can swap order after downsampling
+        best_val, best_loc = -1.0, None
+        margin = 2 * factor  # Covers the rounding error of the downsampled grid
+        for _ in range(ScreenUtils.pyramid_candidates):
+            _, _, _, coarse_loc = cv2.minMaxLoc(coarse)
+            x1 = max(0, coarse_loc[0] * factor - margin)
+            y1 = max(0, coarse_loc[1] * factor - margin)
+            x2 = min(screen_width, coarse_loc[0] * factor + target_width + margin)
+            y2 = min(screen_height, coarse_loc[1] * factor + target_height + margin)
+            if x2 - x1 >= target_width and y2 - y1 >= target_height:
+                max_val, max_loc = ScreenUtils._best_match(screen_gray[y1:y2, x1:x2], target_gray)
+                if max_val > best_val:
+                    best_val, best_loc = max_val, (x1 + max_loc[0], y1 + max_loc[1])
+
+            # Suppress this peak before looking for the next one
+            cv2.rectangle(coarse, (coarse_loc[0] - small_target.shape[1] // 2, coarse_loc[1] - small_target.shape[0] // 2),
+                          (coarse_loc[0] + small_target.shape[1] // 2, coarse_loc[1] + small_target.shape[0] // 2),
+                          -1.0, thickness=-1)
+
+        if best_val < threshold:
+            return None
+        return best_loc
 
-            result = cv2.matchTemplate(screen_gray, target_gray, cv2.TM_CCOEFF_NORMED)
-            _, max_val, _, max_loc = cv2.minMaxLoc(result)
+    @staticmethod
+    def _pyramid_factor(match_mode):
+        if match_mode == "full":
+            return 1
+        if match_mode in ("pyramid2", "pyramid4"):
+            return int(match_mode[-1])
+        raise ValueError(f"Unknown match mode '{match_mode}'. Use 'full', 'pyramid2' or 'pyramid4'.")
 
-            if max_val >= threshold:
-                top_left_x = 1920 + max_loc[0]
-                top_left_y = max_loc[1]
-                bottom_right_x = top_left_x + target_width
-                bottom_right_y = top_left_y + target_height
-                return top_left_x, top_left_y, bottom_right_x, bottom_right_y
+    @staticmethod
+    def set_match_mode(template_name, match_mode):
+        """
+        Sets the default matching mode of a template.
+
+        Parameters:
+            template_name (str): Template name without '.png' (e.g. 'relative move').
+            match_mode (str): 'full', 'pyramid2' or 'pyramid4'.
+        """
+        ScreenUtils._pyramid_factor(match_mode)  # Validate
+        ScreenUtils.template_match_modes[template_name] = match_mode
+
+    @staticmethod
+    def get_match_mode(image_path, match_mode=None):
+        """
+        Resolves the matching mode for a lookup: the per-call mode wins over the per-template mode,
+        which wins over ScreenUtils.default_match_mode.
+        """
+        if match_mode is not None:
+            return match_mode
+        template_name = os.path.splitext(os.path.basename(image_path))[0]
+        return ScreenUtils.template_match_modes.get(template_name, ScreenUtils.default_match_mode)
+
+    @staticmethod
+    def set_frame_source(frame_source):
+        """
+        Switches where ScreenUtils takes its frames from (e.g. a ReplayFrameSource for offline runs).
+        Location hints are dropped because they belong to the previous source.
+
+        Returns:
+            FrameSource: The previous frame source.
+        """
+        previous = ScreenUtils.frame_source
+        ScreenUtils.frame_source = frame_source
+        ScreenUtils.location_hints.forget()
+        return previous
+
+    @staticmethod
+    def location_hint_stats():
+        """
+        Returns how often the last-known-location fast path found the template.
+        """
+        return ScreenUtils.location_hints.stats()
+
+    @staticmethod
+    def wait_until(image_path, appears=True, timeout=None, settle=0.0, poll_interval=0.1,
+                   full_check_interval=5.0, change_tolerance=8, monitor_index=2, threshold=0.8):
+        """
+        Waits until a target image appears on (or disappears from) the screen.
+
+        Only a small region around the template's last known location is captured at the
+        polling rate. The template is matched again only when that region's pixels change;
+        a miss inside the region, or a periodic check while the condition is not met,
+        falls back to a full-screen search so a window that moved is still found. While the
+        template has no known location yet, only the periodic full-screen search runs.
+
+        Parameters:
+            image_path (str): Path of the target image.
+            appears (bool): True to wait for the image to appear, False to wait for it to disappear.
+            timeout (float, optional): Seconds to wait before giving up. None waits forever.
+            settle (float): Seconds the condition has to hold before returning.
+            poll_interval (float): Seconds between region captures.
+            full_check_interval (float): Seconds between full-screen searches while the condition is not met
+                                         (the first search runs at once).
+            change_tolerance (int): Largest per-pixel gray-level difference treated as "unchanged".
+            monitor_index (int): Monitor to watch.
+            threshold (float): Minimum match score.
+
+        Returns:
+            tuple or bool: Center (x, y) of the image when waiting for it to appear, True when it
+                           disappeared, or None if the timeout expired.
+        """
+        target_gray = ScreenUtils.templates.get(image_path)
+        target_height, target_width = target_gray.shape[:2]
+        hints = ScreenUtils.location_hints
+
+        start = time.monotonic()
+        satisfied_since = None
+        last_full_check = None
+        previous_region, previous_pixels = None, None
+        match = None
+
+        while True:
+            now = time.monotonic()
+            monitor = ScreenUtils.frame_source.monitor(monitor_index)
+            region = hints.search_region(image_path, (monitor["height"], monitor["width"]))
+            condition_met = (match is not None) == appears
+            full_check_due = last_full_check is None or (
+                not condition_met and now - last_full_check >= full_check_interval)
+
+            if full_check_due:
+                match = ScreenUtils._locate_on_screen(image_path, monitor_index, threshold)
+                last_full_check = now
+                previous_region, previous_pixels = None, None
+            elif region is not None:
+                x1, y1, x2, y2 = region
+                pixels = ScreenUtils.frame_source.grab(
+                    {"left": monitor["left"] + x1, "top": monitor["top"] + y1, "width": x2 - x1, "height": y2 - y1},
+                    mode="gray", pooled=False)
+                changed = (region != previous_region or
+                           cv2.norm(previous_pixels, pixels, cv2.NORM_INF) > change_tolerance)
+                previous_region, previous_pixels = region, pixels
+
+                if changed:
+                    max_val, max_loc = ScreenUtils._best_match(pixels, target_gray)
+                    if max_val >= threshold:
+                        top_left_x, top_left_y = x1 + max_loc[0], y1 + max_loc[1]
+                        hints.update(image_path, top_left_x, top_left_y, target_width, target_height)
+                        match = (monitor["left"] + top_left_x, monitor["top"] + top_left_y, target_width, target_height)
+                    else:
+                        # Gone from its last location; it may have moved, so confirm on the whole screen
+                        match = ScreenUtils._locate_on_screen(image_path, monitor_index, threshold)
+                        last_full_check = now
+
+            if (match is not None) == appears:
+                satisfied_since = now if satisfied_since is None else satisfied_since
+                if now - satisfied_since >= settle:
+                    return ScreenUtils.center_of(match) if appears else True
+            else:
+                satisfied_since = None
+
+            if timeout is not None and now - start >= timeout:
+                return None
+            time.sleep(poll_interval)
+
+    @staticmethod
+    def match_memo_stats():
+        """
+        Returns how often a full-screen match was answered from the content-hash memo.
+        """
+        return ScreenUtils.match_memo.stats()
+
+    @staticmethod
+    def center_of(match):
+        """
+        Converts a (top_left_x, top_left_y, width, height) match into its center coordinates.
+        """
+        if match is None:
             return None
+        top_left_x, top_left_y, target_width, target_height = match
+        return top_left_x + target_width // 2, top_left_y + target_height // 2
 
     @staticmethod
     def calculate_relative_positions_from_edges(image_path, absolute_positions, monitor_index=2, threshold=0.8):
@@ -116,6 +409,14 @@ class ScreenUtils:
         coords1 = ScreenUtils.find_image_center_on_screen(image_path1, monitor_index, threshold)
         coords2 = ScreenUtils.find_image_center_on_screen(image_path2, monitor_index, threshold)
 
+        return ScreenUtils.absolute_from_anchor_centers(coords1, coords2, relative_positions)
+
+    @staticmethod
+    def absolute_from_anchor_centers(coords1, coords2, relative_positions):
+        """
+        Calculates absolute positions from relative positions using the centers of two
+        already located reference images.
+        """
         if coords1 is None or coords2 is None:
             raise ValueError("Could not find both reference images on the screen.")
 
@@ -150,26 +451,31 @@ class ScreenUtils:
         Returns:
             Image: A PIL Image object of the captured screenshot area.
         """
+        return Image.fromarray(ScreenUtils.capture_screen_area_array(x1, y1, x2, y2, pooled=False))
+
+    @staticmethod
+    def capture_screen_area_array(x1, y1, x2, y2, mode="rgb", pooled=True):
+        """
+        Captures a specific rectangular area of the screen straight into a NumPy array.
+
+        Parameters:
+            x1, y1, x2, y2 (int): Coordinates of the diagonal corners of the rectangle to capture.
+                                  (top-left and bottom-right).
+            mode (str): 'rgb', 'gray' or 'bgra' (zero-copy view of the raw capture).
+            pooled (bool): Reuse a preallocated buffer. Pooled frames are overwritten by later
+                           captures of the same size, so pass False to keep the frame.
+
+        Returns:
+            numpy.ndarray: The captured area.
+        """
         # Ensure all coordinates are integers
         x1, y1, x2, y2 = map(int, [x1, y1, x2, y2])
 
-        with mss.mss() as sct:
-            # Define the bounding box for the area to capture
-            bbox = {'left': x1, 'top': y1, 'width': x2 - x1, 'height': y2 - y1}
-            
-            # Capture the screen area
-            screenshot = sct.grab(bbox)
-
-            # Convert the screenshot to a PIL Image
-            img = Image.frombytes("RGB", screenshot.size, screenshot.rgb)
-            return img
+        # Define the bounding box for the area to capture
+        bbox = {'left': x1, 'top': y1, 'width': x2 - x1, 'height': y2 - y1}
+        return ScreenUtils.frame_source.grab(bbox, mode=mode, pooled=pooled)
 
     @staticmethod
     def capture_screen_as_variable(monitor_index=2):
-        with mss.mss() as sct:
-            monitor = sct.monitors[monitor_index]
-            screenshot = sct.grab(monitor)
-            img = Image.frombytes("RGB", screenshot.size, screenshot.rgb)
-            return img
+        return Image.fromarray(ScreenUtils.frame_source.grab(monitor_index, mode="rgb", pooled=False))
     
-	
@@ -0,0 +1,103 @@
+import numpy as np
+
+
+class StageState:
+    # Change of the (X, Y) readout in microns per micron moved with each direction button
+    DIRECTION_DELTAS = {"right": (-1.0, 0.0), "left": (1.0, 0.0), "up": (0.0, 1.0), "down": (0.0, -1.0)}
+
+    def __init__(self, verify_every=10, drift_budget=2.0, drift_per_move=0.1, drift_per_micron=0.001, tolerance=0.5):
+        """
+        Dead-reckoning model of the stage position (X, Y, Extension).
+
+        Commanded moves and extensions update the predicted position, so it does not have to be
+        read back with OCR after every move. Each move adds to a predicted drift; a verification
+        against the readout is due every verify_every moves or once the predicted drift exceeds
+        the budget. Verifications are logged, and the model re-syncs to the readout.
+
+        Parameters:
+            verify_every (int): Maximum number of moves between two verifications.
+            drift_budget (float): Predicted drift in microns that triggers a verification.
+            drift_per_move (float): Predicted drift in microns added by every move.
+            drift_per_micron (float): Predicted drift added per micron of travel.
+            tolerance (float): Largest prediction error in microns that is not reported as a discrepancy.
+        """
+        self.verify_every = verify_every
+        self.drift_budget = drift_budget
+        self.drift_per_move = drift_per_move
+        self.drift_per_micron = drift_per_micron
+        self.tolerance = tolerance
+
+        self.position = None  # Predicted (X, Y, Extension); None until the first readout
+        self.moves_since_sync = 0
+        self.predicted_drift = 0.0
+        self.errors = []  # Prediction error (X, Y, Extension) of every verification
+        self.discrepancies = 0
+
+    def needs_verification(self):
+        """
+        Returns True if the predicted position should be checked against the readout.
+        """
+        return (self.position is None or None in self.position
+                or self.moves_since_sync >= self.verify_every or self.predicted_drift > self.drift_budget)
+
+    def apply_move(self, amount, direction):
+        """
+        Updates the predicted position after a relative move.
+        """
+        self.moves_since_sync += 1
+        self.predicted_drift += self.drift_per_move + self.drift_per_micron * abs(amount)
+        if self.position is None:
+            return
+        delta_x, delta_y = self.DIRECTION_DELTAS[direction]
+        x, y, extension = self.position
+        self.position = (x + delta_x * amount if x is not None else None,
+                         y + delta_y * amount if y is not None else None,
+                         extension)
+
+    def apply_extension(self, extension):
+        """
+        Updates the predicted extension after it was set.
+        """
+        if self.position is not None:
+            self.position = (self.position[0], self.position[1], extension)
+
+    def observe(self, measured):
+        """
+        Compares a readout with the prediction, records the error and re-syncs to the readout.
+        Fields the readout could not provide keep their predicted value.
+
+        Parameters:
+            measured (tuple): (X, Y, Extension) read from the instrument.
+
+        Returns:
+            tuple: The synced position.
+        """
+        if self.position is not None and None not in self.position and None not in measured:
+            error = tuple(float(m - p) for m, p in zip(measured, self.position))
+            self.errors.append(error)
+            if max(abs(value) for value in error[:2]) > self.tolerance:
+                self.discrepancies += 1
+                print(f"Stage position drifted from the prediction by ΔX={error[0]:.3f}, ΔY={error[1]:.3f} "
+                      f"after {self.moves_since_sync} moves; re-synced to the readout.")
+
+        if self.position is not None:
+            measured = tuple(m if m is not None else p for m, p in zip(measured, self.position))
+        self.position = tuple(measured)
+        self.moves_since_sync = 0
+        self.predicted_drift = 0.0
+        return self.position
+
+    def error_stats(self):
+        """
+        Returns statistics of the prediction errors found by verifications as a dictionary.
+        """
+        if not self.errors:
+            return {"verifications": 0, "discrepancies": 0}
+        errors = np.array(self.errors)
+        return {
+            "verifications": len(errors),
+            "discrepancies": self.discrepancies,
+            "mean_error": errors.mean(axis=0).tolist(),
+            "rms_error": np.sqrt((errors ** 2).mean(axis=0)).tolist(),
+            "max_abs_error": np.abs(errors).max(axis=0).tolist(),
+        }
@@ -0,0 +1,82 @@
+import os
+
+import numpy as np
+
+
+class StageTransform:
+    def __init__(self, origin, scale, stage_origin=(0.0, 0.0), rotation=0.0, invert=(False, False)):
+        """
+        Maps image pixels (macro or micro) to stage microns and back, for whole arrays of points:
+
+            stage = stage_origin + flip(rotate(pixels - origin) / scale)
+
+        Two transforms sharing the same stage frame convert between their images through the
+        stage: micro.to_pixels(macro.to_stage(points)).
+
+        Parameters:
+            origin (tuple): Image pixel (x, y) that corresponds to stage_origin.
+            scale (float or tuple): Pixels per micron, for both axes or as (X, Y).
+            stage_origin (tuple): Stage position (X, Y) in microns of the origin pixel.
+            rotation (float): Angle in degrees by which pixel offsets are rotated onto the stage axes.
+            invert (tuple): Whether the stage X and Y axes point against the image x and y axes.
+        """
+        self.origin = np.asarray(origin, dtype=float)
+        self.scale = np.broadcast_to(np.asarray(scale, dtype=float), (2,)).copy()
+        self.stage_origin = np.asarray(stage_origin, dtype=float)
+        self.rotation = rotation
+        self.invert = tuple(bool(flag) for flag in invert)
+
+        angle = np.radians(rotation)
+        self.rotation_matrix = np.array([[np.cos(angle), -np.sin(angle)],
+                                         [np.sin(angle), np.cos(angle)]])
+        self.signs = np.where(self.invert, -1.0, 1.0)
+
+    @staticmethod
+    def _points(points):
+        return np.asarray(points, dtype=float).reshape(-1, 2)
+
+    def to_stage(self, pixels):
+        """
+        Converts image pixels to stage microns.
+
+        Parameters:
+            pixels (array-like): Points (x, y), shape (N, 2).
+
+        Returns:
+            numpy.ndarray: Stage positions (X, Y) in microns, shape (N, 2).
+        """
+        offsets = self._points(pixels) - self.origin
+        if self.rotation:
+            offsets = offsets @ self.rotation_matrix.T
+        return offsets / self.scale * self.signs + self.stage_origin
+
+    def to_pixels(self, stage):
+        """
+        Converts stage microns to image pixels.
+
+        Parameters:
+            stage (array-like): Stage positions (X, Y) in microns, shape (N, 2).
+
+        Returns:
+            numpy.ndarray: Points (x, y) in image pixels, shape (N, 2).
+        """
+        offsets = (self._points(stage) - self.stage_origin) * self.signs * self.scale
+        if self.rotation:
+            offsets = offsets @ self.rotation_matrix  # Inverse rotation
+        return offsets + self.origin
+
+    def write_array_file(self, pixels, file_path):
+        """
+        Writes the stage positions of image points as an array import file for the instrument,
+        one 'X, Y' line in microns per point.
+
+        Returns:
+            str: The file path.
+        """
+        directory = os.path.dirname(file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        lines = [f"{x}, {y}\n" for x, y in self.to_stage(pixels).tolist()]
+        with open(file_path, "w") as file:
+            file.write("".join(lines))
+        return file_path
@@ -0,0 +1,108 @@
+import os
+from collections import OrderedDict
+
+import cv2
+
+
+class TemplateRegistry:
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        """
+        Keeps decoded grayscale button templates in memory so each asset is read from disk once.
+
+        Parameters:
+            max_bytes (int): Memory cap for the cached templates. Least recently used entries
+                             are evicted when the cap is exceeded.
+        """
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # path -> (mtime_ns, grayscale template)
+        self._total_bytes = 0
+        self.loads = 0
+        self.hits = 0
+
+    @staticmethod
+    def _key(image_path):
+        return os.path.normpath(image_path)
+
+    def get(self, image_path):
+        """
+        Returns the grayscale template stored at image_path.
+        The file is decoded again only if it is new or its modification time has changed.
+
+        Parameters:
+            image_path (str): Path of the template image (e.g. 'assets/start.png').
+
+        Returns:
+            numpy.ndarray: Read-only grayscale template.
+        """
+        key = self._key(image_path)
+        try:
+            mtime = os.stat(key).st_mtime_ns
+        except OSError:
+            raise ValueError(f"Could not load image at {image_path}")
+
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == mtime:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        target_img = cv2.imread(key, cv2.IMREAD_UNCHANGED)
+        if target_img is None:
+            raise ValueError(f"Could not load image at {image_path}")
+
+        if target_img.ndim == 2:
+            target_gray = target_img
+        elif target_img.shape[2] == 4:
+            target_gray = cv2.cvtColor(target_img, cv2.COLOR_BGRA2GRAY)
+        else:
+            target_gray = cv2.cvtColor(target_img, cv2.COLOR_BGR2GRAY)
+        target_gray.setflags(write=False)  # Shared between callers, never modify in place
+
+        self._evict(key)
+        self._entries[key] = (mtime, target_gray)
+        self._total_bytes += target_gray.nbytes
+        self.loads += 1
+        self._enforce_cap()
+        return target_gray
+
+    def preload(self, image_directory, extension=".png"):
+        """
+        Decodes every template in a directory ahead of time.
+
+        Parameters:
+            image_directory (str): Directory containing the template images.
+            extension (str): File extension of the templates.
+        """
+        if not os.path.isdir(image_directory):
+            return
+        for file_name in sorted(os.listdir(image_directory)):
+            if file_name.lower().endswith(extension):
+                self.get(os.path.join(image_directory, file_name))
+
+    def clear(self):
+        """
+        Drops all cached templates.
+        """
+        self._entries.clear()
+        self._total_bytes = 0
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, image_path):
+        return self._key(image_path) in self._entries
+
+    def _evict(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry[1].nbytes
+
+    def _enforce_cap(self):
+        # Always keep the most recent entry, even if it alone exceeds the cap
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            self._evict(key)
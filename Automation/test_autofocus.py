@@ -0,0 +1,58 @@
+import math
+import unittest
+
+from autofocus import Autofocus
+
+
+class FakeAutomation:
+    def __init__(self):
+        self.extension = 0.0
+        self.sequences = 0
+
+    def set_extension(self, extension):
+        self.extension = extension
+        self.sequences += 1
+
+    def focus_to(self, z, tolerance=None):
+        if abs(z - self.extension) > tolerance:
+            self.set_extension(z)
+
+
+class CurveAutofocus(Autofocus):
+    def __init__(self, curve, **kwargs):
+        super().__init__(FakeAutomation(), settle=0, **kwargs)
+        self.curve = curve
+
+    def score_view(self):
+        return self.curve(self.auto.extension)
+
+
+def gaussian(peak, sigma, baseline=50.0, height=2000.0):
+    return lambda extension: baseline + height * math.exp(-0.5 * ((extension - peak) / sigma) ** 2)
+
+
+class AutofocusTest(unittest.TestCase):
+    def test_finds_peak_within_tolerance(self):
+        for peak in (0.4, 3.2, 5.5, 7.0, 9.17, 10.8):
+            for sigma in (0.3, 0.6, 1.5, 3.0):
+                autofocus = CurveAutofocus(gaussian(peak, sigma))
+                extension, _, captures = autofocus.run(0.0, 11.0)
+                self.assertLessEqual(abs(extension - peak), autofocus.tolerance, (peak, sigma))
+                self.assertLessEqual(captures, 15, (peak, sigma))
+                self.assertEqual(autofocus.auto.extension, extension)
+
+    def test_flat_top_within_tolerance(self):
+        def flat_top(extension):
+            return gaussian(6.3, 0.8)(6.3 + max(0.0, abs(extension - 6.3) - 0.2))
+
+        autofocus = CurveAutofocus(flat_top)
+        extension, _, _ = autofocus.run(0.0, 11.0)
+        self.assertLessEqual(abs(extension - 6.3), 0.2 + autofocus.tolerance)
+
+    def test_rejects_invalid_range(self):
+        with self.assertRaises(ValueError):
+            CurveAutofocus(gaussian(5.0, 1.0)).run(5.0, 5.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
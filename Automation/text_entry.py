@@ -0,0 +1,140 @@
+import re
+import time
+
+import pyautogui
+import pytesseract
+
+from screen_utils import ScreenUtils
+
+try:
+    import pyperclip
+except ImportError:  # Only needed for the 'paste' mode
+    pyperclip = None
+
+
+class TextEntry:
+    MODES = ("paste", "fast", "type")
+
+    def __init__(self, mode="type", interval=0.1, verify=True, field_size=(160, 26), tail=12):
+        """
+        Enters text into the focused field of the iMicro UI.
+
+        Modes:
+            'paste': copy the text to the clipboard and paste it with Ctrl+V (needs pyperclip).
+            'fast': type it without a delay between keys.
+            'type': type it key by key with the given interval (the original behaviour).
+
+        In the 'paste' and 'fast' modes, when a field region is given and verify is set, the field
+        is read back with OCR after the entry; a mismatch is retyped once key by key. Every call is timed and recorded in
+        history, so the modes can be compared with stats().
+
+        Parameters:
+            mode (str): 'paste', 'fast' or 'type'.
+            interval (float): Seconds between keys in 'type' mode.
+            verify (bool): Read back fast entries whose field region is known.
+            field_size (tuple): Size (width, height) of the region read around a field's click point.
+            tail (int): Number of trailing characters that have to be visible in a field too narrow
+                        for the whole text (e.g. long paths).
+        """
+        self.interval = interval
+        self.verify = verify
+        self.field_size = field_size
+        self.tail = tail
+        self.history = []
+        self.set_mode(mode)
+
+    def set_mode(self, mode):
+        """
+        Switches the entry mode; 'paste' falls back to 'fast' when pyperclip is not installed.
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown text entry mode: {mode}. Use 'paste', 'fast' or 'type'.")
+        if mode == "paste" and pyperclip is None:
+            print("pyperclip is not installed; using the 'fast' text entry mode instead of 'paste'.")
+            mode = "fast"
+        self.mode = mode
+
+    def region_around(self, point):
+        """
+        Returns the region (x1, y1, x2, y2) of field_size centered on a field's click point.
+        """
+        width, height = self.field_size
+        x, y = point
+        return int(x - width / 2), int(y - height / 2), int(x + width / 2), int(y + height / 2)
+
+    def enter(self, text, region=None):
+        """
+        Enters text into the focused field.
+
+        Parameters:
+            text (str): Text to enter.
+            region (tuple, optional): Screen region (x1, y1, x2, y2) showing the field, to verify the entry.
+
+        Returns:
+            dict: Record of the call with 'mode', 'characters', 'seconds' and 'verified'
+                  (None when the entry was not verified).
+        """
+        text = str(text)
+        start = time.perf_counter()
+        self._send(text, self.mode)
+
+        verified = None
+        if self.verify and region is not None and self.mode != "type":
+            verified = self.check(text, region)
+            if not verified:
+                print(f"Text entry of '{text}' could not be verified; typing it again key by key.")
+                pyautogui.hotkey('ctrl', 'a')
+                pyautogui.press('backspace')
+                self._send(text, "type")
+                verified = self.check(text, region)
+                if not verified:
+                    print(f"Warning: the field does not show '{text}' after retyping.")
+
+        record = {"mode": self.mode, "characters": len(text),
+                  "seconds": time.perf_counter() - start, "verified": verified}
+        self.history.append(record)
+        return record
+
+    def _send(self, text, mode):
+        if mode == "paste":
+            previous = pyperclip.paste()
+            pyperclip.copy(text)
+            pyautogui.hotkey('ctrl', 'v')
+            time.sleep(0.05)  # Let the field take the clipboard before it is restored
+            pyperclip.copy(previous)
+        elif mode == "fast":
+            pyautogui.write(text, interval=0)
+        else:
+            pyautogui.write(text, interval=self.interval)
+
+    @staticmethod
+    def _normalize(text):
+        return re.sub(r"\s+", "", text).lower()
+
+    def check(self, text, region):
+        """
+        Reads a field with OCR and checks that it shows the text (or at least its last
+        characters, for fields that scroll).
+
+        Returns:
+            bool: Whether the text was found.
+        """
+        x1, y1, x2, y2 = map(int, region)
+        field = ScreenUtils.capture_screen_area_array(x1, y1, x2, y2, mode="gray", pooled=False)
+        shown = self._normalize(pytesseract.image_to_string(field, config="--psm 7"))
+        expected = self._normalize(text)
+        return expected in shown or (len(expected) > self.tail and expected[-self.tail:] in shown)
+
+    def stats(self):
+        """
+        Returns the number of calls, characters, total seconds and failed verifications per mode.
+        """
+        stats = {}
+        for record in self.history:
+            mode_stats = stats.setdefault(record["mode"], {"calls": 0, "characters": 0, "seconds": 0.0,
+                                                           "failed_verifications": 0})
+            mode_stats["calls"] += 1
+            mode_stats["characters"] += record["characters"]
+            mode_stats["seconds"] += record["seconds"]
+            mode_stats["failed_verifications"] += record["verified"] is False
+        return stats
@@ -0,0 +1,259 @@
+import json
+import os
+
+import cv2
+import numpy as np
+from PIL import Image
+
+try:
+    import tifffile
+except ImportError:  # Only needed to stream TIFF sources
+    tifffile = None
+
+
+class TiledLevel:
+    def __init__(self, tiles, width, height):
+        """
+        One resolution level of a TiledImage. Slicing it like an image array
+        (level[y1:y2, x1:x2]) reads only the tiles that overlap the region.
+
+        Parameters:
+            tiles (numpy.ndarray): Memory-mapped tiles of shape (tile rows, tile columns, tile size, tile size, channels).
+            width (int): Width of the level in pixels.
+            height (int): Height of the level in pixels.
+        """
+        self.tiles = tiles
+        self.tile_size = tiles.shape[2]
+        channels = tiles.shape[4]
+        self.shape = (height, width, channels) if channels > 1 else (height, width)
+        self.dtype = tiles.dtype
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple) or len(key) != 2 or not all(isinstance(k, slice) for k in key):
+            raise ValueError("Tiled images only support region reads of the form level[y1:y2, x1:x2].")
+        y1, y2, y_step = key[0].indices(self.shape[0])
+        x1, x2, x_step = key[1].indices(self.shape[1])
+        if y_step != 1 or x_step != 1:
+            raise ValueError("Tiled images do not support strided reads.")
+        return self.read_region(x1, y1, x2, y2)
+
+    def read_region(self, x1, y1, x2, y2):
+        """
+        Reads a region of the level.
+
+        Returns:
+            numpy.ndarray: Pixels of the region (a copy, independent of the file).
+        """
+        height, width = self.shape[:2]
+        x1, x2 = max(0, x1), min(width, x2)
+        y1, y2 = max(0, y1), min(height, y2)
+        if x1 >= x2 or y1 >= y2:
+            return np.zeros((0, 0) + self.shape[2:], dtype=self.dtype)
+
+        size = self.tile_size
+        row1, row2 = y1 // size, (y2 - 1) // size + 1
+        column1, column2 = x1 // size, (x2 - 1) // size + 1
+        block = self.tiles[row1:row2, column1:column2]
+        rows, columns = block.shape[:2]
+        # (rows, columns, size, size, channels) -> (rows * size, columns * size, channels)
+        block = block.transpose(0, 2, 1, 3, 4).reshape(rows * size, columns * size, -1)
+        region = block[y1 - row1 * size:y2 - row1 * size, x1 - column1 * size:x2 - column1 * size]
+        return region.reshape(region.shape[:2] + self.shape[2:])
+
+
+class TiledImage:
+    def __init__(self, store_directory):
+        """
+        Memory-mapped, tiled multi-resolution copy of a large image, created once by convert().
+        Regions and downsampled levels are read from disk on demand, so the memory needed to
+        view or process the image is bounded by the size of the region, not of the image.
+
+        Parameters:
+            store_directory (str): Directory written by convert().
+        """
+        with open(os.path.join(store_directory, "meta.json")) as file:
+            self.meta = json.load(file)
+        self.store_directory = store_directory
+        self.levels = []
+        for index, (width, height) in enumerate(self.meta["levels"]):
+            tiles = np.load(os.path.join(store_directory, f"level_{index}.npy"), mmap_mode="r")
+            self.levels.append(TiledLevel(tiles, width, height))
+        self.shape = self.levels[0].shape
+        self.dtype = self.levels[0].dtype
+
+    def __getitem__(self, key):
+        # Full-resolution region reads, as on an image array: image[y1:y2, x1:x2]
+        return self.levels[0][key]
+
+    @classmethod
+    def open(cls, image_path, store_directory=None, tile_size=512):
+        """
+        Opens the tiled copy of an image, converting the image first if the copy is missing or stale.
+
+        Parameters:
+            image_path (str): Path to the source image.
+            store_directory (str, optional): Directory of the tiled copy. Defaults to '<image_path>.tiles'.
+            tile_size (int): Tile size in pixels used for a new conversion.
+
+        Returns:
+            TiledImage: The opened image.
+        """
+        store_directory = store_directory or f"{image_path}.tiles"
+        meta_path = os.path.join(store_directory, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as file:
+                meta = json.load(file)
+            stat = os.stat(image_path)
+            if meta.get("source_mtime_ns") == stat.st_mtime_ns and meta.get("source_size") == stat.st_size:
+                return cls(store_directory)
+        return cls.convert(image_path, store_directory, tile_size=tile_size)
+
+    @classmethod
+    def convert(cls, image_path, store_directory, tile_size=512, min_level_size=512, max_decode_pixels=2 ** 30):
+        """
+        Converts an image into the tiled on-disk format, with a 2x downsampled level per step
+        until the larger side is below min_level_size.
+
+        Sources are streamed tile by tile, never decoded into memory as a whole: .npy arrays are
+        memory-mapped, and TIFF files are memory-mapped (uncompressed) or decoded into a scratch
+        file in the store directory (compressed) with tifffile. Other formats are decoded once
+        with OpenCV, which needs the whole image in memory; larger ones than max_decode_pixels
+        are refused, as OpenCV refuses images above 2 ** 30 pixels by default.
+
+        Parameters:
+            image_path (str): Path to the source image (.npy, TIFF, or any OpenCV format).
+            store_directory (str): Directory that receives the tiled copy.
+            tile_size (int): Tile size in pixels (even).
+            min_level_size (int): No level is built with a larger side below this size.
+            max_decode_pixels (int): Largest image decoded into memory with OpenCV.
+
+        Returns:
+            TiledImage: The converted image.
+        """
+        if tile_size % 2:
+            raise ValueError("tile_size must be even.")
+        if not os.path.exists(image_path):
+            raise FileNotFoundError(f"Image not found at {image_path}")
+        os.makedirs(store_directory, exist_ok=True)
+        stat = os.stat(image_path)
+        meta = {"tile_size": tile_size, "levels": [],
+                "source_mtime_ns": stat.st_mtime_ns, "source_size": stat.st_size}
+
+        # Level 0: copy the source tile by tile
+        scratch_path = os.path.join(store_directory, "source.scratch")
+        source, as_color = cls._open_source(image_path, scratch_path, max_decode_pixels)
+        height, width = source.shape[:2]
+        channels = 3 if as_color else (source.shape[2] if source.ndim == 3 else 1)
+        dtype = np.uint8 if as_color else source.dtype
+        tiles = cls._create_level(store_directory, 0, width, height, channels, tile_size, dtype)
+        cls._copy_tiles(source, tiles, as_color)
+        del source
+        if os.path.exists(scratch_path):
+            os.remove(scratch_path)
+        meta["levels"].append((width, height))
+
+        # Coarser levels: every tile is the 2x area average of a 2 x 2 tile block of the previous level
+        previous = TiledLevel(tiles, width, height)
+        while max(width, height) >= 2 * min_level_size:
+            width, height = width // 2, height // 2
+            index = len(meta["levels"])
+            tiles = cls._create_level(store_directory, index, width, height, channels, tile_size, dtype)
+            for row in range(tiles.shape[0]):
+                for column in range(tiles.shape[1]):
+                    block = previous.read_region(2 * column * tile_size, 2 * row * tile_size,
+                                                 2 * (column + 1) * tile_size, 2 * (row + 1) * tile_size)
+                    block = block[:block.shape[0] // 2 * 2, :block.shape[1] // 2 * 2]
+                    if block.size == 0:
+                        continue
+                    half = cv2.resize(block, (block.shape[1] // 2, block.shape[0] // 2), interpolation=cv2.INTER_AREA)
+                    tiles[row, column, :half.shape[0], :half.shape[1]] = half.reshape(half.shape[:2] + (channels,))
+            tiles.flush()
+            meta["levels"].append((width, height))
+            previous = TiledLevel(tiles, width, height)
+
+        with open(os.path.join(store_directory, "meta.json"), "w") as file:
+            json.dump(meta, file)
+        print(f"Converted {image_path} to {len(meta['levels'])} tiled levels in {store_directory}")
+        return cls(store_directory)
+
+    @staticmethod
+    def _open_source(image_path, scratch_path, max_decode_pixels):
+        # Returns the source as an array-like read block by block, and whether its blocks still
+        # have to be converted to 8-bit BGR (the layout cv2.imread gives every other source)
+        extension = os.path.splitext(image_path)[1].lower()
+        if extension == ".npy":
+            return np.load(image_path, mmap_mode="r"), False
+
+        if extension in (".tif", ".tiff") and tifffile is not None:
+            try:
+                return tifffile.memmap(image_path, mode="r"), True
+            except ValueError:  # Compressed or not contiguous: decode into a file instead of memory
+                return tifffile.imread(image_path, out=scratch_path), True
+
+        # The header gives the size without decoding the pixels
+        max_pixels, Image.MAX_IMAGE_PIXELS = Image.MAX_IMAGE_PIXELS, None
+        try:
+            with Image.open(image_path) as image:
+                width, height = image.size
+        except OSError:
+            width = height = None  # Left to OpenCV
+        finally:
+            Image.MAX_IMAGE_PIXELS = max_pixels
+        if width is not None and width * height > max_decode_pixels:
+            hint = "install tifffile to stream it" if extension in (".tif", ".tiff") else "save it as a TIFF or .npy"
+            raise ValueError(f"{image_path} is {width} x {height} pixels, more than the {max_decode_pixels} pixels "
+                             f"that are decoded into memory; {hint}.")
+
+        source = cv2.imread(image_path, cv2.IMREAD_COLOR)
+        if source is None:
+            raise ValueError(f"Could not decode the image at {image_path}")
+        return source, False
+
+    @staticmethod
+    def _copy_tiles(source, tiles, as_color):
+        tile_size, channels = tiles.shape[2], tiles.shape[4]
+        for row in range(tiles.shape[0]):
+            for column in range(tiles.shape[1]):
+                block = np.asarray(source[row * tile_size:(row + 1) * tile_size,
+                                          column * tile_size:(column + 1) * tile_size])
+                if as_color:
+                    block = TiledImage._to_bgr(block)
+                tiles[row, column, :block.shape[0], :block.shape[1]] = block.reshape(block.shape[:2] + (channels,))
+        tiles.flush()
+
+    @staticmethod
+    def _to_bgr(block):
+        # 8-bit BGR, as cv2.imread(..., cv2.IMREAD_COLOR) reads the same file
+        if block.dtype != np.uint8:
+            block = (block // 256 if block.dtype == np.uint16 else np.clip(block, 0, 255)).astype(np.uint8)
+        if block.ndim == 2:
+            return cv2.cvtColor(block, cv2.COLOR_GRAY2BGR)
+        if block.shape[2] == 4:
+            return cv2.cvtColor(block, cv2.COLOR_RGBA2BGR)
+        return cv2.cvtColor(block, cv2.COLOR_RGB2BGR)
+
+    @staticmethod
+    def _create_level(store_directory, index, width, height, channels, tile_size, dtype):
+        rows, columns = -(-height // tile_size), -(-width // tile_size)
+        return np.lib.format.open_memmap(os.path.join(store_directory, f"level_{index}.npy"), mode="w+",
+                                         dtype=dtype, shape=(rows, columns, tile_size, tile_size, channels))
+
+    def read_region(self, x1, y1, x2, y2, level=0):
+        """
+        Reads a region given in pixels of the requested level (level n is downsampled by 2 ** n).
+
+        Returns:
+            numpy.ndarray: Pixels of the region.
+        """
+        return self.levels[level].read_region(x1, y1, x2, y2)
+
+    def downsampled(self, max_size):
+        """
+        Returns the finest level whose larger side fits in max_size (the coarsest level if none fits).
+
+        Returns:
+            tuple: (image as numpy.ndarray, downsampling factor relative to full resolution).
+        """
+        for index, level in enumerate(self.levels):
+            if max(level.shape[:2]) <= max_size or index == len(self.levels) - 1:
+                return level[0:level.shape[0], 0:level.shape[1]], 2 ** index
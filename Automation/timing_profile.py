@@ -0,0 +1,165 @@
+import json
+import os
+import time
+
+import numpy as np
+
+from screen_utils import ScreenUtils
+
+
+class TimingProfile:
+    # Profile -> (latency percentile, safety factor applied to it)
+    PROFILES = {"safe": (95, 1.5), "fast": (75, 1.1)}
+
+    def __init__(self, path=None, profile="safe", learning=False, min_samples=5, max_samples=100,
+                 timeout_factor=3.0, poll_interval=0.05, save_every=20):
+        """
+        Learned delays for UI actions, replacing fixed sleeps.
+
+        While learning, a wait whose effect can be observed (a template that appears, or a
+        condition such as the readout reaching the target) ends as soon as the effect shows, and
+        the latency is recorded per action. Outside learning, waits sleep a percentile of the
+        recorded latencies times a safety factor: the 95th percentile x 1.5 for the 'safe' profile,
+        the 75th x 1.1 for 'fast'. Actions with fewer than min_samples samples, and the 'fixed'
+        profile, keep the hard-coded default. Latencies are persisted as JSON at path, every
+        save_every new samples and on save().
+
+        Parameters:
+            path (str, optional): JSON file the latencies are loaded from and saved to.
+            profile (str): 'safe', 'fast' or 'fixed'.
+            learning (bool): Observe effects and record their latencies.
+            min_samples (int): Samples needed before an action's delay is learned.
+            max_samples (int): Most recent samples kept per action.
+            timeout_factor (float): An observed wait gives up after timeout_factor times the default.
+            poll_interval (float): Seconds between checks of an observed effect.
+            save_every (int): Number of new samples after which the latencies are saved to path.
+        """
+        self.path = path
+        self.learning = learning
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self.timeout_factor = timeout_factor
+        self.poll_interval = poll_interval
+        self.save_every = save_every
+        self.unsaved = 0
+        self.latencies = {}  # action -> recorded latencies in seconds
+        self.waits = {}  # action -> [number of waits, seconds waited, seconds of the defaults]
+        self.set_profile(profile)
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def set_profile(self, profile):
+        """
+        Switches between the 'safe', 'fast' and 'fixed' profiles.
+        """
+        if profile not in self.PROFILES and profile != "fixed":
+            raise ValueError(f"Unknown timing profile: {profile}. Use 'safe', 'fast' or 'fixed'.")
+        self.profile = profile
+
+    def delay(self, action, default):
+        """
+        Returns the delay of an action under the current profile.
+        """
+        samples = self.latencies.get(action, ())
+        if self.profile == "fixed" or len(samples) < self.min_samples:
+            return default
+        percentile, factor = self.PROFILES[self.profile]
+        return float(np.percentile(samples, percentile)) * factor
+
+    def record(self, action, seconds):
+        """
+        Adds a measured latency of an action.
+        """
+        samples = self.latencies.setdefault(action, [])
+        samples.append(round(float(seconds), 4))
+        del samples[:-self.max_samples]
+        self.unsaved += 1
+        if self.path is not None and self.unsaved >= self.save_every:
+            self.save()
+
+    def wait(self, action, default, until=None):
+        """
+        Waits for a UI action to take effect.
+
+        Parameters:
+            action (str): Name of the action the latencies are kept under.
+            default (float): Hard-coded delay in seconds the action used to wait.
+            until (str or callable, optional): Observable effect, used while learning: the path of a
+                                               template that appears, or a function returning True
+                                               once the effect shows.
+
+        Returns:
+            float: Seconds waited.
+        """
+        start = time.monotonic()
+        if self.learning and until is not None:
+            timeout = self.timeout_factor * default
+            if isinstance(until, str):
+                ScreenUtils.wait_until(until, timeout=timeout, poll_interval=self.poll_interval)
+            else:
+                while not until() and time.monotonic() - start < timeout:
+                    time.sleep(self.poll_interval)
+            # Effects not seen before the timeout are recorded as the timeout, which keeps the delay safe
+            self.record(action, time.monotonic() - start)
+        else:
+            time.sleep(self.delay(action, default))
+
+        waited = time.monotonic() - start
+        totals = self.waits.setdefault(action, [0, 0.0, 0.0])
+        totals[0] += 1
+        totals[1] += waited
+        totals[2] += default
+        return waited
+
+    def saved_seconds(self):
+        """
+        Returns the wall-clock seconds saved against the hard-coded delays so far.
+        """
+        return sum(default - waited for _, waited, default in self.waits.values())
+
+    def report(self):
+        """
+        Prints and returns the latencies, delays and time saved per action.
+
+        Returns:
+            dict: action -> statistics, with the totals under 'total'.
+        """
+        report = {}
+        for action in sorted(set(self.latencies) | set(self.waits)):
+            samples = self.latencies.get(action, [])
+            count, waited, default = self.waits.get(action, [0, 0.0, 0.0])
+            report[action] = {
+                "samples": len(samples),
+                "p50": float(np.percentile(samples, 50)) if samples else None,
+                "p95": float(np.percentile(samples, 95)) if samples else None,
+                "waits": count, "waited_seconds": waited, "saved_seconds": default - waited,
+            }
+            p50 = "-" if not samples else f"{report[action]['p50']:.2f}"
+            p95 = "-" if not samples else f"{report[action]['p95']:.2f}"
+            print(f"{action:<24} samples {len(samples):>4}  p50 {p50:>6}  p95 {p95:>6}  "
+                  f"waits {count:>4}  saved {default - waited:8.1f} s")
+
+        report["total"] = {"waits": sum(totals[0] for totals in self.waits.values()),
+                           "saved_seconds": self.saved_seconds()}
+        print(f"Profile '{self.profile}': {self.saved_seconds():.1f} s saved over {report['total']['waits']} waits")
+        return report
+
+    def load(self):
+        """
+        Loads the latencies saved at self.path.
+        """
+        with open(self.path) as file:
+            self.latencies = {action: list(samples) for action, samples in json.load(file).items()}
+
+    def save(self):
+        """
+        Saves the latencies to self.path.
+        """
+        if self.path is None:
+            raise ValueError("No path to save the timing profile to.")
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "w") as file:
+            json.dump(self.latencies, file, indent=1)
+        self.unsaved = 0
@@ -0,0 +1,153 @@
+import sys
+import time
+
+import cv2
+import numpy as np
+import pandas as pd
+import pytesseract
+
+from ContourOverlayAligner import ContourOverlayAlignerCV
+from button_locator import ButtonLocator
+from frame_source import ReplayFrameSource
+from numeric_readout import NumericReadout
+from screen_utils import ScreenUtils
+
+
+def _time_call(function, repeats):
+    """
+    Runs function repeats times and returns (mean milliseconds per call, last result).
+    """
+    result = None
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = function()
+    elapsed = time.perf_counter() - start
+    return elapsed / repeats * 1000, result
+
+
+def benchmark_locate(frames="assets/whole_software.png", image_directory="assets", button_names=None, repeats=20):
+    """
+    Measures the throughput of the locate/capture pipeline offline by replaying recorded frames.
+
+    Parameters:
+        frames (str or list of str): PNG frame(s) or a directory of recorded frames to replay.
+        image_directory (str): Directory containing the button templates.
+        button_names (list of str, optional): Buttons to locate. Defaults to the anchors and common buttons.
+        repeats (int): Number of timed repetitions per measurement.
+
+    Returns:
+        dict: Measurement name mapped to mean milliseconds per call.
+    """
+    if button_names is None:
+        button_names = ["puck 2", "start", "add", "Z control", "relative move", "Extension control"]
+
+    previous = ScreenUtils.set_frame_source(ReplayFrameSource(frames))
+    try:
+        locator = ButtonLocator(image_directory)
+        timings = {}
+
+        for button_name in button_names:
+            def locate_cold():
+                ScreenUtils.location_hints.forget()
+                ScreenUtils.match_memo.clear()
+                return locator.get_button_coordinates(button_name)
+
+            def locate_memoized():
+                ScreenUtils.location_hints.forget()
+                return locator.get_button_coordinates(button_name)
+
+            timings[f"locate '{button_name}' (cold)"], _ = _time_call(locate_cold, repeats)
+            timings[f"locate '{button_name}' (memo)"], _ = _time_call(locate_memoized, repeats)
+            timings[f"locate '{button_name}' (hinted)"], _ = _time_call(
+                lambda: locator.get_button_coordinates(button_name), repeats)
+
+        timings["evaluate_dynamic_buttons"], _ = _time_call(
+            lambda: locator.evaluate_dynamic_buttons(image_directory), repeats)
+
+        x1, y1, x2, y2 = locator.get_bounding_box(image_dir=image_directory, corner_1="Bbox_XYZ_1", corner_2="Bbox_XYZ_2")
+        timings["capture XYZ readout area"], _ = _time_call(
+            lambda: ScreenUtils.capture_screen_area_array(x1, y1, x2, y2), repeats)
+
+        timings["location hint hit rate"] = ScreenUtils.location_hint_stats()["hit_rate"]
+        timings["match memo hit rate"] = ScreenUtils.match_memo_stats()["hit_rate"]
+        return timings
+    finally:
+        ScreenUtils.set_frame_source(previous)
+
+
+def benchmark_readout(frames="assets/whole_software.png", image_directory="assets", repeats=20):
+    """
+    Compares the glyph-matching XYZ readout with the Tesseract path of get_xyz_positions.
+    Requires the Tesseract binary, which is used once to locate the fields and learn the glyphs.
+
+    Returns:
+        dict: Measurement name mapped to mean milliseconds per call.
+    """
+    previous = ScreenUtils.set_frame_source(ReplayFrameSource(frames))
+    try:
+        locator = ButtonLocator(image_directory)
+        x1, y1, x2, y2 = locator.get_bounding_box(image_dir=image_directory, corner_1="Bbox_XYZ_1", corner_2="Bbox_XYZ_2")
+        image = ScreenUtils.capture_screen_area_array(x1, y1, x2, y2, pooled=False)
+
+        timings = {}
+        timings["tesseract image_to_string (previous path)"], _ = _time_call(
+            lambda: pytesseract.image_to_string(image, lang='eng'), max(1, repeats // 10))
+
+        readout = NumericReadout()
+        timings["calibrate (tesseract image_to_data)"], _ = _time_call(lambda: readout.calibrate(image), 1)
+        timings["glyph readout"], values = _time_call(lambda: readout.read(image), repeats)
+        if values is None:
+            timings["glyph readout"] = float("nan")
+        print(f"Glyph readout values (x, y, extension): {values}")
+        return timings
+    finally:
+        ScreenUtils.set_frame_source(previous)
+
+
+def benchmark_overlay(frames="assets/whole_software.png", image_directory="assets", repeats=200,
+                      scale_x=5.89052520107227, scale_y=5.5226654358700005):
+    """
+    Measures the frame rate of the contour alignment overlay on the micro view of a recorded
+    frame, with a synthetic 10 x 8 blitz grid.
+
+    Returns:
+        dict: Frames per second while dragging (offset changes every frame) and while idle.
+    """
+    previous = ScreenUtils.set_frame_source(ReplayFrameSource(frames))
+    try:
+        locator = ButtonLocator(image_directory)
+        x1, y1, x2, y2 = locator.get_bounding_box(image_dir=image_directory)
+        screenshot = cv2.cvtColor(ScreenUtils.capture_screen_area_array(x1, y1, x2, y2, pooled=False),
+                                  cv2.COLOR_RGB2BGR)
+    finally:
+        ScreenUtils.set_frame_source(previous)
+
+    x, y = np.meshgrid(np.arange(0, 100, 10.0), np.arange(0, 80, 10.0))
+    selected_data = pd.DataFrame({"X Position": x.ravel(), "Y Position": y.ravel(),
+                                  "MODULUS": (np.sin(x / 20) + np.cos(y / 15)).ravel()})
+    aligner = ContourOverlayAlignerCV(screenshot, selected_data, scale_x, scale_y, Z_var="MODULUS")
+    aligner.overlay_contour()  # Render the contour layer once
+
+    def drag():
+        aligner.offset_x += 1
+        return aligner.overlay_contour()
+
+    timings = {}
+    drag_ms, _ = _time_call(drag, repeats)
+    idle_ms, _ = _time_call(aligner.overlay_contour, repeats)
+    timings["overlay fps while dragging"] = 1000 / drag_ms
+    timings["overlay fps while idle"] = 1000 / idle_ms
+    return timings
+
+
+def print_timings(timings):
+    for name, value in timings.items():
+        print(f"{name:45s} {value:10.3f}")
+
+
+if __name__ == "__main__":
+    # Usage: python Automation/vision_benchmark.py [frame.png | frame_directory]
+    frames = sys.argv[1] if len(sys.argv) > 1 else "assets/whole_software.png"
+    print_timings(benchmark_locate(frames))
+    print_timings(benchmark_overlay(frames))
+    print_timings(benchmark_readout(frames))